@@ -0,0 +1,35 @@
+"""
+Compares pyconll and native conllu readers on sample treebanks. Reports time spent only reading sentences and time
+needed to form all trees (reading included).
+
+Run from repository root:
+    python scripts/benchmark_conllu_readers.py
+"""
+from benchmark_utils import REPOSITORY_DIR, read_configs, best_time
+
+from stark.data.summary import Summary
+from stark.processing.document_processor import DocumentProcessor
+from stark.processing.filters import read_filters
+from stark.processing.processor import Processor
+
+
+def benchmark(path, conllu_reader):
+    configs = read_configs(path, ['--conllu_reader', conllu_reader])
+    document_processor = DocumentProcessor(str(path), Processor(configs, read_filters(configs)))
+    reading_time = best_time(lambda: sum(1 for _ in document_processor._read_sentences(configs)))
+    forming_time = best_time(lambda: document_processor.create_trees(Summary(), configs))
+    return reading_time, forming_time
+
+
+def main():
+    print('file\treader\treading (s)\ttrees formed (s)')
+    for path in sorted(REPOSITORY_DIR.joinpath('sample').glob('*.conllu')):
+        if path.stat().st_size < 100:
+            continue
+        for conllu_reader in ['pyconll', 'native']:
+            reading_time, forming_time = benchmark(path, conllu_reader)
+            print(f'{path.name}\t{conllu_reader}\t{reading_time:.3f}\t{forming_time:.3f}')
+
+
+if __name__ == '__main__':
+    main()
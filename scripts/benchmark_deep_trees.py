@@ -0,0 +1,71 @@
+"""
+Counts subtrees of synthetic sentences with extreme shapes: chains (every token depends on the previous one) and stars
+(all tokens depend on the first one), 1000 tokens long by default. Both greedy counters are run with the default
+recursion limit of Python, together with pickling of sentences (as they are sent to worker processes and caches).
+
+Run from repository root:
+    python scripts/benchmark_deep_trees.py [number of tokens in sentence] [number of sentences]
+"""
+import pickle
+import sys
+import tempfile
+
+from benchmark_utils import form_document, timed
+
+# `stark` raises the limit on import, deep sentences should not need it
+sys.setrecursionlimit(1000)
+
+UPOS = ['NOUN', 'VERB', 'ADJ', 'ADV', 'PRON']
+
+SETTINGS = [
+    ['--size', '2-3', '--processing_size', '2-3', '--complete', 'no', '--example', 'no'],
+    ['--size', '2-3', '--processing_size', '2-3', '--complete', 'no', '--example', 'yes'],
+]
+
+
+def write_sentence(corpus_file, sentence_id, heads):
+    """
+    Writes a sentence in conllu format with given heads of tokens.
+    """
+    corpus_file.write(f'# sent_id = {sentence_id}\n')
+    for i, head in enumerate(heads):
+        upos = UPOS[i % len(UPOS)]
+        corpus_file.write(f'{i + 1}\tw{i % 50}\tw{i % 50}\t{upos}\t_\t_\t{head}\t{"root" if head == 0 else "dep"}\t_\t_\n')
+    corpus_file.write('\n')
+
+
+def count(path, args):
+    """
+    Counts subtrees of a file and returns number of different subtrees.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'yes', '--association_measures', 'no', '--cpu_cores', '1', '--node_type', 'upos']
+        + args)
+    _, pickle_duration = timed(lambda: pickle.loads(pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL)))
+    _, duration = timed(lambda: processor.get_counter_class(None)([document], summary, filters, configs).run())
+    return len(summary.representation_trees), duration, pickle_duration
+
+
+def main():
+    tokens_number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sentences_number = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    shapes = {
+        'chain': list(range(tokens_number)),
+        'star': [0] + [1] * (tokens_number - 1),
+    }
+    print('shape\tsettings\ttrees\tcounting (s)\tpickling (s)')
+    for shape, heads in shapes.items():
+        with tempfile.NamedTemporaryFile('w', suffix='.conllu', encoding='utf-8') as corpus_file:
+            for i in range(sentences_number):
+                write_sentence(corpus_file, f'{shape}-{i}', heads)
+            corpus_file.flush()
+            for args in SETTINGS:
+                try:
+                    trees, duration, pickle_duration = count(corpus_file.name, args)
+                    print(f'{shape}\t{" ".join(args)}\t{trees}\t{duration:.2f}\t{pickle_duration:.2f}')
+                except RecursionError:
+                    print(f'{shape}\t{" ".join(args)}\tRecursionError')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares greedy counter, which creates representation trees for every subtree instance, with greedy counter that counts
+only keys of subtrees. Reports counting time and number of representation objects (nodes and trees) created during
+counting (counted in a separate run, as counting slows down execution).
+
+Run from repository root:
+    python scripts/benchmark_greedy_key_counter.py [path to conllu file]
+"""
+import gc
+
+from benchmark_utils import get_corpus_path, form_document, timed
+
+from stark.data.representation.greedy_tree import GreedyRepresentationTree
+from stark.data.representation.node import RepresentationNode
+from stark.processing.counters import GreedyCounter, GreedyKeyCounter
+
+SETTINGS = [
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--fixed', 'no'],
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--fixed', 'yes', '--ignored_labels', 'punct'],
+    ['--size', '1-6', '--processing_size', '1-6', '--complete', 'yes', '--fixed', 'yes'],
+]
+
+
+def count_objects(cls, created):
+    """
+    Wraps constructor of a class so that it counts created objects.
+    """
+    init = cls.__init__
+
+    def counted_init(self, *args, **kwargs):
+        created[cls.__name__] = created.get(cls.__name__, 0) + 1
+        init(self, *args, **kwargs)
+
+    cls.__init__ = counted_init
+    return init
+
+
+def count(path, args, counter_class, created=None):
+    configs, filters, summary, _, document = form_document(
+        path, ['--greedy_counter', 'yes', '--node_type', 'upos', '--example', 'no', '--association_measures', 'no',
+               '--cpu_cores', '1'] + args)
+    gc.collect()
+    original_inits = {}
+    if created is not None:
+        for cls in [RepresentationNode, GreedyRepresentationTree]:
+            original_inits[cls] = count_objects(cls, created)
+    _, duration = timed(lambda: counter_class([document], summary, filters, configs).run())
+    for cls, init in original_inits.items():
+        cls.__init__ = init
+    instances = sum(summary.representation_trees.numbers)
+    return duration, instances
+
+
+def main():
+    path = get_corpus_path('en_ewt-ud-dev.conllu')
+    print('settings\tcounter\tsubtree instances\tcounting (s)\trepresentation objects created')
+    for args in SETTINGS:
+        for counter_class in [GreedyCounter, GreedyKeyCounter]:
+            duration, instances = count(path, args, counter_class)
+            created = {}
+            count(path, args, counter_class, created)
+            print(f'{" ".join(args)}\t{counter_class.__name__}\t{instances}\t{duration:.3f}\t{sum(created.values())}')
+
+
+if __name__ == '__main__':
+    main()
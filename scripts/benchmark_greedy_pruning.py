@@ -0,0 +1,48 @@
+"""
+Measures work of greedy counting with a head restriction (`--head upos=NOUN`): number of subtrees that are enumerated
+as output candidates, number of counted subtrees and duration of counting.
+
+Run from repository root:
+    python scripts/benchmark_greedy_pruning.py [path to conllu file]
+"""
+from benchmark_utils import get_corpus_path, form_document, timed
+
+from stark.processing.counters import GreedyKeyCounter
+
+SETTINGS = [
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--node_type', 'upos', '--example', 'no'],
+    ['--size', '3-4', '--processing_size', '1-4', '--complete', 'no', '--node_type', 'form', '--example', 'no'],
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--node_type', 'upos', '--example', 'yes'],
+    ['--size', '2-6', '--processing_size', '2-6', '--complete', 'yes', '--node_type', 'upos', '--example', 'yes'],
+]
+
+
+def count(path, args):
+    """
+    Counts subtrees of a file and returns number of candidates, number of different subtrees and duration.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'yes', '--association_measures', 'no', '--cpu_cores', '1', '--head', 'upos=NOUN']
+        + args)
+    counter_class = processor.get_counter_class(None)
+    candidates = 0
+    for tree in document.trees:
+        for tree_root in tree:
+            if counter_class is GreedyKeyCounter:
+                candidates += len(tree_root.get_subtree_instances(filters, summary.vocabulary)[1])
+            else:
+                candidates += len(tree_root.get_subtrees(filters)[1])
+    _, duration = timed(lambda: counter_class([document], summary, filters, configs).run())
+    return candidates, len(summary.representation_trees), duration
+
+
+def main():
+    path = get_corpus_path('sl_ssj-ud-dev.conllu')
+    print('settings\tcandidates\ttrees\tcounting (s)')
+    for args in SETTINGS:
+        candidates, trees, duration = count(path, args)
+        print(f'{" ".join(args)}\t{candidates}\t{trees}\t{duration:.2f}')
+
+
+if __name__ == '__main__':
+    main()
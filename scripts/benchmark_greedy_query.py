@@ -0,0 +1,39 @@
+"""
+Measures duration of greedy counting with queries, where every enumerated subtree is matched against query trees.
+
+Run from repository root:
+    python scripts/benchmark_greedy_query.py [path to conllu file]
+"""
+from benchmark_utils import get_corpus_path, form_document, timed
+
+QUERIES = [
+    'upos=NOUN >amod _',
+    'upos=VERB >nsubj _ >obj _',
+    'upos=VERB >obj (upos=NOUN >amod _)',
+    'upos=VERB > _ > _ > _',
+    '_ > _ > (_ > _)',
+]
+
+
+def count(path, query):
+    """
+    Counts subtrees of a file that fit query and returns number of different subtrees and duration.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'yes', '--association_measures', 'no', '--cpu_cores', '1', '--node_type', 'upos',
+               '--complete', 'no', '--query', query], queries=True)
+    _, duration = timed(lambda: processor.get_counter_class(summary.query_trees)([document], summary, filters,
+                                                                                 configs).run())
+    return len(summary.representation_trees), duration
+
+
+def main():
+    path = get_corpus_path('sl_ssj-ud-dev.conllu')
+    print('query\ttrees\tcounting (s)')
+    for query in QUERIES:
+        trees, duration = count(path, query)
+        print(f'{query}\t{trees}\t{duration:.2f}')
+
+
+if __name__ == '__main__':
+    main()
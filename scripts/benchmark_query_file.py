@@ -0,0 +1,47 @@
+"""
+Measures duration of counting a battery of queries in a single pass (`--query_file`) and one query at a time.
+
+Run from repository root:
+    python scripts/benchmark_query_file.py [path to conllu file]
+"""
+import tempfile
+from pathlib import Path
+
+from benchmark_utils import get_corpus_path, form_document, timed
+
+HEADS = ['NOUN', 'VERB', 'ADJ', 'ADV', 'PRON', 'PROPN', 'AUX', 'NUM', 'DET', 'ADP']
+DEPRELS = ['nsubj', 'obj', 'obl', 'amod', 'advmod', 'nmod', 'det', 'case', 'conj', 'cop']
+QUERIES = [f'upos={head} >{deprel} _' for head in HEADS for deprel in DEPRELS] + \
+          [f'upos={head} >{deprel} _ > _' for head in HEADS for deprel in DEPRELS]
+
+
+def count(path, query_args):
+    """
+    Counts trees of queries and returns number of different trees and duration of counting.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'no', '--association_measures', 'no', '--cpu_cores', '1', '--node_type', 'upos',
+               '--complete', 'no'] + query_args, queries=True)
+    _, duration = timed(lambda: processor.get_counter_class(summary.query_trees)([document], summary, filters,
+                                                                                 configs).run())
+    return len(summary.representation_trees), duration
+
+
+def main():
+    path = get_corpus_path('sl_ssj-ud-dev.conllu')
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.write('\n'.join(QUERIES))
+    trees, duration = count(path, ['--query_file', f.name])
+    Path(f.name).unlink()
+    print('queries\ttrees\tcounting (s)')
+    print(f'{len(QUERIES)} in a single pass\t{trees}\t{duration:.2f}')
+    trees, duration = 0, 0
+    for query in QUERIES:
+        query_trees, query_duration = count(path, ['--query', query])
+        trees += query_trees
+        duration += query_duration
+    print(f'{len(QUERIES)} one at a time\t{trees}\t{duration:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures duration of counting with selective queries on a corpus that is indexed with `stark index` (see
+`CorpusIndex`): when all sentences are searched from their roots, when sentences are prefiltered with their masks (see
+`QueryPrefilter`) and when only sentences and heads found in index are searched.
+
+Run from repository root:
+    python scripts/benchmark_query_index.py [path to conllu file]
+"""
+import tempfile
+
+from benchmark_utils import get_corpus_path, read_configs, form_document, timed
+
+from stark import stark
+
+QUERIES = [
+    'L=biti >nsubj _',
+    'form=je',
+    'Number=Plur >det upos=DET',
+    'upos=NOUN >amod _',
+    '_ >conj (_ >conj _)',
+]
+
+
+def count(path, query, internal_saves, mode):
+    """
+    Counts subtrees of an indexed file that fit query and returns number of different subtrees and duration.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--internal_saves', internal_saves, '--greedy_counter', 'no', '--association_measures', 'no',
+               '--cpu_cores', '1', '--node_type', 'form', '--complete', 'no', '--example', 'yes', '--query', query],
+        queries=True)
+    counter = processor.get_counter_class(summary.query_trees)([document], summary, filters, configs)
+    if mode != 'index':
+        document.index = None
+    if mode == 'roots':
+        counter.create_prefilter = lambda: None
+    _, duration = timed(counter.run)
+    return len(summary.representation_trees), duration
+
+
+def main():
+    path = get_corpus_path('sl_ssj-ud-dev.conllu')
+    with tempfile.TemporaryDirectory() as internal_saves:
+        _, duration = timed(lambda: stark.create_index(read_configs(path, ['--internal_saves', internal_saves])))
+        print(f'indexing (s)\t{duration:.2f}')
+        print('query\ttrees\tcounting from roots (s)\tcounting with masks (s)\tcounting with index (s)')
+        for query in QUERIES:
+            durations = []
+            for mode in ['roots', 'masks', 'index']:
+                trees, duration = count(path, query, internal_saves, mode)
+                durations.append(f'{duration:.2f}')
+            print(f'{query}\t{trees}\t' + '\t'.join(durations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Microbenchmark of checks of query restrictions and root whitelist (`Filter.check_query_tree` and
+`Filter.check_root_whitelist`) on all nodes of a treebank.
+
+Run from repository root:
+    python scripts/benchmark_query_predicates.py [path to conllu file]
+"""
+from benchmark_utils import get_corpus_path, form_document, best_time
+
+from stark.processing.filters import read_filters, Filter
+from stark.processing.query_trees import compile_query_tree, decode_query
+
+QUERY_NODES = [
+    ('upos=NOUN', ''),
+    ('upos=NOUN&Case=Nom', '>nsubj'),
+    ('L=be|upos=AUX|upos=VERB', ''),
+    ('!upos=PUNCT&Number=Plur', '>!obj'),
+]
+
+ROOT_WHITELISTS = [
+    'upos=NOUN',
+    'upos=VERB&Mood=Ind|upos=AUX&Mood=Ind',
+    'deprel=nsubj&!Number=Sing',
+]
+
+
+def get_nodes(document):
+    """
+    Returns all nodes of a treebank.
+    """
+    nodes = []
+    for tree in document.trees:
+        stack = list(tree)
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.children)
+    return nodes
+
+
+def main():
+    path = get_corpus_path('en_ewt-ud-dev.conllu')
+    configs, filters, _, _, document = form_document(path, ['--greedy_counter', 'no', '--complete', 'no',
+                                                            '--processing_size', '2-10000'])
+    nodes = get_nodes(document)
+
+    print('check\tns/node')
+    for query, dependency_type in QUERY_NODES:
+        query_tree = compile_query_tree(decode_query('(' + query + ')', dependency_type))
+        duration = best_time(lambda: [Filter.check_query_tree(query_tree, node, node.children, filters)
+                                      for node in nodes], repeats=5)
+        print(f'query {dependency_type} {query}\t{duration / len(nodes) * 1e9:.0f}')
+    for root_whitelist in ROOT_WHITELISTS:
+        whitelist_filters = read_filters(dict(configs, root_whitelist=root_whitelist.split('|')))
+        duration = best_time(lambda: [Filter.check_root_whitelist(node, whitelist_filters) for node in nodes],
+                             repeats=5)
+        print(f'head {root_whitelist}\t{duration / len(nodes) * 1e9:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Measures duration of counting with queries with and without prefilter of sentences (`QueryPrefilter`), that skips
+sentences which cannot contain query trees.
+
+Run from repository root:
+    python scripts/benchmark_query_prefilter.py [path to conllu file]
+"""
+from benchmark_utils import get_corpus_path, form_document, timed
+
+QUERIES = [
+    'L=biti >nsubj _',
+    'form=je',
+    'upos=NOUN >amod _',
+    'Number=Plur >det upos=DET',
+    '_ >conj (_ >conj _)',
+    'upos=VERB > _ > _ > _',
+]
+
+
+def count(path, query, prefilter):
+    """
+    Counts subtrees of a file that fit query and returns number of different subtrees, number of skipped sentences
+    and duration.
+    """
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'no', '--association_measures', 'no', '--cpu_cores', '1', '--node_type', 'upos',
+               '--complete', 'no', '--query', query], queries=True)
+    counter = processor.get_counter_class(summary.query_trees)([document], summary, filters, configs)
+    if not prefilter:
+        counter.create_prefilter = lambda: None
+    _, duration = timed(counter.run)
+    return len(summary.representation_trees), counter.skipped_sentences_number, duration
+
+
+def main():
+    path = get_corpus_path('sl_ssj-ud-dev.conllu')
+    print('query\ttrees\tskipped sentences\tcounting without prefilter (s)\tcounting with prefilter (s)')
+    for query in QUERIES:
+        trees, _, duration = count(path, query, False)
+        prefiltered_trees, skipped, prefiltered_duration = count(path, query, True)
+        assert trees == prefiltered_trees
+        print(f'{query}\t{trees}\t{skipped}\t{duration:.2f}\t{prefiltered_duration:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compares memory used by results of counting (`Summary.representation_trees`) stored in columnar `RepresentationTable`
+and in the previous layout, a dictionary with a dictionary for every tree. Both are measured as freshly unpickled
+copies, so that only objects that belong to results are counted.
+
+Run from repository root:
+    python scripts/benchmark_representation_table.py [path to conllu file]
+"""
+import gc
+import pickle
+import tracemalloc
+
+from benchmark_utils import get_corpus_path, form_document
+
+SETTINGS = [
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--node_type', 'upos', '--example', 'no'],
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--node_type', 'form', '--example', 'no'],
+    ['--size', '2-4', '--processing_size', '2-4', '--complete', 'no', '--node_type', 'upos+form', '--head', 'upos=NOUN',
+     '--example', 'no'],
+    ['--size', '2-3', '--processing_size', '2-3', '--complete', 'no', '--node_type', 'upos', '--example', 'yes'],
+]
+
+
+def count(path, args):
+    configs, filters, summary, processor, document = form_document(
+        path, ['--greedy_counter', 'yes', '--association_measures', 'no', '--cpu_cores', '1'] + args)
+    processor.get_counter_class(None)([document], summary, filters, configs).run()
+    return summary.representation_trees
+
+
+def to_dictionaries(table):
+    """
+    Converts table to a dictionary of trees as they were stored before (with a new list for every name parts).
+    """
+    return {key: {column: [list(name_parts) for name_parts in value] if column == 'word_array' else value
+                  for column, value in row.items()}
+            for key, row in table.items()}
+
+
+def measure(data):
+    """
+    Returns memory (in MB) taken by an unpickled copy of data.
+    """
+    pickled = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    gc.collect()
+    tracemalloc.start()
+    copy = pickle.loads(pickled)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del copy
+    return size / 1024 / 1024
+
+
+def main():
+    path = get_corpus_path('en_ewt-ud-dev.conllu')
+    print('settings\ttrees\ttable (MB)\tdictionaries (MB)')
+    for args in SETTINGS:
+        table = count(path, args)
+        print(f'{" ".join(args)}\t{len(table)}\t{measure(table):.1f}\t{measure(to_dictionaries(table)):.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measures memory held by trees formed from a corpus, per token. Corpus is created by repeating sentences of a sample
+treebank until it has the requested number of tokens (1M by default).
+
+Run from repository root:
+    python scripts/benchmark_tree_memory.py [number of tokens] [path to conllu file]
+"""
+import gc
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from benchmark_utils import get_corpus_path, read_configs, timed
+
+from stark.data.summary import Summary
+from stark.processing.document_processor import DocumentProcessor
+from stark.processing.filters import read_filters
+from stark.processing.processor import Processor
+
+
+def create_corpus(path, tokens_number, corpus_file):
+    """
+    Writes sentences of conllu file to corpus file (repeatedly) until it contains tokens_number tokens.
+    """
+    sentences = Path(path).read_text(encoding='utf-8').strip().split('\n\n')
+    written_tokens = 0
+    while written_tokens < tokens_number:
+        for sentence in sentences:
+            corpus_file.write(sentence + '\n\n')
+            written_tokens += sum(1 for line in sentence.split('\n') if line and line[0].isdigit())
+            if written_tokens >= tokens_number:
+                break
+    corpus_file.flush()
+    return written_tokens
+
+
+def main():
+    tokens_number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    path = get_corpus_path('en_ewt-ud-dev.conllu', argument_index=2)
+    with tempfile.NamedTemporaryFile('w', suffix='.conllu', encoding='utf-8') as corpus_file:
+        tokens_number = create_corpus(path, tokens_number, corpus_file)
+        for greedy_counter in ['yes', 'no']:
+            configs = read_configs(corpus_file.name, ['--greedy_counter', greedy_counter, '--conllu_reader', 'native',
+                                                      '--size', '2', '--processing_size', '2'])
+            filters = read_filters(configs)
+            gc.collect()
+            tracemalloc.start()
+            document, duration = timed(lambda: DocumentProcessor(corpus_file.name, Processor(configs, filters))
+                                       .form_trees(Summary(), configs))
+            gc.collect()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f'greedy_counter={greedy_counter}\t{tokens_number} tokens\t{size / 1024 / 1024:.1f} MB\t'
+                  f'{size / tokens_number:.0f} B/token\t{duration:.1f} s (traced)')
+            del document
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Helpers shared by benchmark scripts: reading settings, forming trees of a corpus and timing. Importing this module
+makes the repository importable and disables informative logging of STARK.
+"""
+import gc
+import logging
+import sys
+import time
+from pathlib import Path
+
+REPOSITORY_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(REPOSITORY_DIR))
+
+from stark.data.summary import Summary
+from stark.processing.document_processor import DocumentProcessor
+from stark.processing.filters import read_filters
+from stark.processing.processor import Processor
+from stark.processing.query_trees import generate_query_trees, get_query_tree_size_range
+from stark.stark import read_settings, parse_args
+
+logging.disable(logging.INFO)
+
+
+def get_corpus_path(default_name, argument_index=1):
+    """
+    Returns path given as command line argument or path of a sample treebank.
+    """
+    if len(sys.argv) > argument_index:
+        return Path(sys.argv[argument_index])
+    return REPOSITORY_DIR / 'sample' / default_name
+
+
+def read_configs(path, args):
+    """
+    Returns settings of default config.ini for input path, overridden by command line style arguments.
+    """
+    return read_settings(str(REPOSITORY_DIR / 'config.ini'), parse_args(['--input', str(path)] + args))
+
+
+def form_document(path, args, queries=False):
+    """
+    Forms trees of a corpus file. When queries are used, query trees are generated as in `stark.count_subtrees`.
+    Returns settings, filters, summary, processor and document.
+    """
+    configs = read_configs(path, args)
+    filters = read_filters(configs)
+    summary = Summary()
+    if queries:
+        summary.set_query_trees(generate_query_trees(configs, filters))
+        if configs['greedy_counter']:
+            filters['tree_size_range'] = get_query_tree_size_range(summary.query_trees)
+    processor = Processor(configs, filters)
+    document = DocumentProcessor(str(path), processor).form_trees(summary, configs)
+    return configs, filters, summary, processor, document
+
+
+def timed(function):
+    """
+    Calls function and returns its result and duration in seconds.
+    """
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+def best_time(function, repeats=3):
+    """
+    Returns the shortest duration (in seconds) of repeated calls of function. Garbage is collected before every call.
+    """
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        _, duration = timed(function)
+        best = duration if best is None else min(best, duration)
+    return best
@@ -0,0 +1,33 @@
+"""
+Creates catalog of query tree shapes (stark/resources/query_shapes.json), that is used for size based queries instead
+of generating shapes on every run. Shapes are written as brackets, a pair for every node.
+
+Run from repository root:
+    python scripts/create_query_shapes.py [maximal size]
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from stark.processing.query_trees import create_ngrams_query_trees, shape_to_string, QUERY_SHAPES_PATH
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    catalog = {}
+    trees = [{}]
+    for size in range(1, max_size + 1):
+        if size > 1:
+            trees = create_ngrams_query_trees(2, trees)
+        catalog[size] = [shape_to_string(tree) for tree in trees]
+        print(f'{size}\t{len(trees)} shapes')
+
+    with open(QUERY_SHAPES_PATH, 'w') as f:
+        json.dump(catalog, f, indent=1)
+        f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1 @@
-from stark.stark import run, read_settings, parse_args
+from stark.stark import run, create_index, read_settings, parse_args
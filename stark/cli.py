@@ -8,6 +8,12 @@ logger = logging.getLogger('stark')
 
 
 def main():
+    # `stark index` only creates indices of input files for later queries
+    if sys.argv[1:2] == ['index']:
+        args = parse_args(sys.argv[2:])
+        stark.create_index(read_settings(args.config_file, args))
+        return
+
     args = parse_args(sys.argv[1:])
 
     settings = read_settings(args.config_file, args)
@@ -16,19 +16,16 @@ class Document(object):
     def __init__(self):
         self.trees = []
         self.sentence_statistics = []
-        self.form_dict = {}
-        self.lemma_dict = {}
-        self.upos_dict = {}
-        self.xpos_dict = {}
-        self.deprel_dict = {}
-        self.misc_dict = {}
+        # masks of attribute values of sentences (see `QueryPrefilter`), None when they are not created
+        self.sentence_masks = []
+        # inverted index of document (see `CorpusIndex`), when it was created in internal_saves
+        self.index = None
 
     def get_document_data(self):
-        return [self.trees, self.form_dict, self.lemma_dict, self.upos_dict, self.xpos_dict, self.deprel_dict, self.misc_dict,
-                self.sentence_statistics]
+        return [self.trees, self.sentence_statistics, self.sentence_masks]
 
     @classmethod
     def create_document_from_cache(cls, doc_data):
         d = cls()
-        d.trees, d.form_dict, d.lemma_dict, d.upos_dict, d.xpos_dict, d.deprel_dict, d.misc_dict, d.sentence_statistics = doc_data
+        d.trees, d.sentence_statistics, d.sentence_masks = doc_data
         return d
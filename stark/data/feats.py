@@ -0,0 +1,54 @@
+# Copyright 2024 CJVT
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+class FeatsBundle(dict):
+    """
+    Morphological features of a token (a dictionary of feat names and values, e.g. {'Case': 'Nom', 'Number': 'Sing'}).
+    Bundles are interned, so all tokens with the same features share a single bundle, which must not be changed. String
+    forms of features (`parts`, e.g. ('Case=Nom', 'Number=Sing') and `string`, e.g. 'Case=Nom|Number=Sing') are
+    calculated once per bundle.
+    """
+    __slots__ = ('parts', 'string')
+
+    # interned bundles by tuples of (feat, value) pairs
+    _bundles = {}
+
+    def __reduce__(self):
+        return FeatsBundle.intern, (tuple(self.items()),)
+
+    @staticmethod
+    def intern(feats):
+        """
+        Returns interned bundle of features.
+        :param feats: Tuple of (feat, value) pairs.
+        :return:
+        """
+        bundle = FeatsBundle._bundles.get(feats)
+        if bundle is None:
+            bundle = FeatsBundle(feats)
+            bundle.parts = tuple(f'{feat}={value}' for feat, value in feats)
+            bundle.string = '|'.join(bundle.parts)
+            FeatsBundle._bundles[feats] = bundle
+        return bundle
+
+    @staticmethod
+    def from_token(feats):
+        """
+        Returns interned bundle of features of a token, where every feat may have multiple values (only one of them is
+        used).
+        :param feats: Dictionary of feat names and sets of values.
+        :return:
+        """
+        return FeatsBundle.intern(tuple((feat, next(iter(values))) for feat, values in feats.items()))
@@ -15,33 +15,44 @@
 from stark.data.processing.tree import Tree
 from stark.data.representation.greedy_tree import GreedyRepresentationTree
 from stark.data.representation.node import RepresentationNode
+from stark.data.vocabulary import OPEN, CLOSE, LEFT, RIGHT, LEFT_LABELED, RIGHT_LABELED
 from stark.processing.filters import Filter
 
+# positions of elements in subtree instances, see `GreedyTree._create_instance`
+INSTANCE_TREE_SIZE, INSTANCE_KEY, INSTANCE_SIZE, INSTANCE_ORDER, INSTANCE_NODE, INSTANCE_CHILDREN, \
+    INSTANCE_STRING_KEY = range(7)
+# positions of elements in node data of subtree instances (separators join keys of nodes to keys of their heads)
+NODE_NAME_PARTS, NODE_NAME, NODE_DEPREL, NODE_LOCATION, NODE_CODE, NODE_LEFT_SEPARATOR, NODE_RIGHT_SEPARATOR, \
+    NODE_STRING_SEPARATOR = range(8)
+
 
 class GreedyTree(Tree):
+    __slots__ = ()
+
     def __init__(self, index, form, lemma, upos, xpos, deprel, head, feats_detailed, token_misc, document, summary):
         super().__init__(index, form, lemma, upos, xpos, deprel, head, feats_detailed, token_misc, document, summary)
 
     @staticmethod
-    def _processing_filter(combinations, child_active_tree, filters):
+    def _processing_filter(combinations, child_tree_size, filters):
         """
-        Utilizes loose filters that might improve greedy performance (ie. tree_size).
+        Utilizes loose filters that might improve greedy performance (ie. tree_size). Label whitelist is already
+        checked before children trees are merged (see `_enumerate_subtrees`).
         :param combinations: List containing previous children combinations.
-        :param child_active_tree: A child to be added to combinations if it passes filters.
+        :param child_tree_size: Size of a child tree to be added to combinations if it passes filters.
         :param filters:
         :return:
         """
         # checks whether tree size is not too high
-        # checks if label is in white list (if such a list exists)
-        return (combinations[0] + child_active_tree.tree_size <= filters['tree_size_range'][-1] and
-                Filter.check_label_whitelist(child_active_tree.node.node.deprel, filters))
+        return combinations[0] + child_tree_size <= filters['tree_size_range'][-1]
 
     @staticmethod
-    def _merge_incomplete_combinations(combinations, child_active_trees, filters):
+    def _merge_incomplete_combinations(combinations, extendable_combinations, child_active_trees, filters):
         """
         Creates all possible combinations of children trees when complete_tree_type=no. It utilizes loose processing
-        filters.
+        filters. Only combinations that are smaller than the maximal tree size are extended, so that nodes with many
+        children do not repeatedly go through combinations that are already full.
         :param combinations: A list of all combinations of a tree node.
+        :param extendable_combinations: A list of combinations (a part of combinations) that can still be extended.
         :param child_active_trees: A list of trees that contain child node.
         :param filters:
         :return:
@@ -50,12 +61,15 @@ class GreedyTree(Tree):
         new_active_trees = []
 
         for child_active_tree in child_active_trees:
-            for combination in combinations:
-                if GreedyTree._processing_filter(combination, child_active_tree, filters):
-                    new_active_trees.append((combination[0] + child_active_tree.tree_size,
+            child_tree_size = GreedyTree._get_size(child_active_tree)
+            for combination in extendable_combinations:
+                if GreedyTree._processing_filter(combination, child_tree_size, filters):
+                    new_active_trees.append((combination[0] + child_tree_size,
                                              combination[1] + [child_active_tree]))
 
         combinations.extend(new_active_trees)
+        extendable_combinations.extend([combination for combination in new_active_trees
+                                        if combination[0] < filters['tree_size_range'][-1]])
         return combinations
 
     @staticmethod
@@ -67,18 +81,34 @@ class GreedyTree(Tree):
         :param child_active_trees:
         :return:
         """
-        if not child_active_trees or not combinations or not GreedyTree._processing_filter(combinations[0], child_active_trees[0], filters):
+        if not child_active_trees or not combinations:
             return []
-        new_combinations_size = combinations[0][0] + child_active_trees[0].tree_size
+        child_tree_size = GreedyTree._get_size(child_active_trees[0])
+        if not GreedyTree._processing_filter(combinations[0], child_tree_size, filters):
+            return []
+        new_combinations_size = combinations[0][0] + child_tree_size
         combinations[0][1].append(child_active_trees[0])
         combinations[0] = (new_combinations_size, combinations[0][1])
         return combinations
 
     @staticmethod
-    def _merge_combinations(combinations, child_active_trees, filters):
+    def _get_size(active_tree):
+        """
+        Returns size of either a representation tree or a subtree instance.
+        :param active_tree:
+        :return:
+        """
+        if isinstance(active_tree, tuple):
+            return active_tree[INSTANCE_TREE_SIZE]
+        return active_tree.tree_size
+
+    @staticmethod
+    def _merge_combinations(combinations, extendable_combinations, child_active_trees, filters):
         """
         Creates all possible combinations of children trees.
         :param combinations: A list of all combinations of a tree node.
+        :param extendable_combinations: A list of combinations that can still be extended (only used when
+        complete_tree_type=no).
         :param child_active_trees: A list of trees that contain child node.
         :param filters:
         :return:
@@ -86,31 +116,190 @@ class GreedyTree(Tree):
         if filters['complete_tree_type']:
             combinations = GreedyTree._merge_complete_combinations(combinations, child_active_trees, filters)
         else:
-            combinations = GreedyTree._merge_incomplete_combinations(combinations, child_active_trees, filters)
+            combinations = GreedyTree._merge_incomplete_combinations(combinations, extendable_combinations,
+                                                                     child_active_trees, filters)
 
         return combinations
 
+    def _enumerate_subtrees(self, create_node, create_tree, filters, vocabulary=None):
+        """
+        Enumerates subtrees of all nodes in post-order without recursion, so that deep sentences do not need a deep
+        stack. Trees of a child are merged into combinations of its head as soon as the child is processed.
+
+        Trees are pruned while they are enumerated. Only trees that pass cheap filters (display size, tree size and
+        root whitelist) are collected as output candidates, and only trees that can still be extended by the head of
+        their root are kept for combining. Trees that are neither are never created.
+        :param create_node: Function that returns data of a node (tree, filters, vocabulary).
+        :param create_tree: Function that creates a tree from node data and a combination (node, combination, filters).
+        :param filters:
+        :param vocabulary:
+        :return: Trees that contain this node (active trees) and a list of candidate trees.
+        """
+        # a list that stores all candidate trees
+        trees = []
+        # A frame for every node on the path to the currently processed node: iterator over children that were not
+        # processed yet, node, node data, all combinations and combinations that can still be extended. Combinations
+        # contain cumulative size of all children, coupled with a list of children. They are set to [(1, [])] because
+        # you always want an empty tree containing only itself.
+        stack = [[iter(self.children), self, create_node(self, filters, vocabulary), [(1, [])], [(1, [])]]]
+        while True:
+            frame = stack[-1]
+            child = next(frame[0], None)
+            if child is not None:
+                stack.append([iter(child.children), child, create_node(child, filters, vocabulary), [(1, [])],
+                              [(1, [])]])
+                continue
+
+            stack.pop()
+            tree = frame[1]
+            # trees can be extended only by heads that accept their deprel
+            extendable = bool(stack) and Filter.check_label_whitelist(tree.deprel, filters)
+            root_whitelisted = Filter.check_root_whitelist(tree, filters)
+            active_trees = []
+            if extendable or root_whitelisted:
+                for combination in frame[3]:
+                    candidate = root_whitelisted and GreedyTree._check_candidate_size(combination[0], filters)
+                    active = extendable and combination[0] < filters['tree_size_range'][-1]
+                    if candidate or active:
+                        subtree = create_tree(frame[2], combination, filters)
+                        if candidate:
+                            trees.append(subtree)
+                        if active:
+                            active_trees.append(subtree)
+            if not stack:
+                return active_trees, trees
+            head_frame = stack[-1]
+            head_frame[3] = GreedyTree._merge_combinations(head_frame[3], head_frame[4], active_trees, filters)
+
+    @staticmethod
+    def _check_candidate_size(tree_size, filters):
+        """
+        Checks whether a tree of given size may be in output (tree size and display size).
+        :param tree_size:
+        :param filters:
+        :return:
+        """
+        return Filter.check_tree_size(tree_size, filters) and Filter.check_display_size(tree_size, filters)
+
     def get_subtrees(self, filters):
         """
-        A recursion that builds representation trees (representation_tree) and stores and collect them (trees).
+        Builds representation trees of all subtrees (see `_enumerate_subtrees`).
+        :param filters:
+        :return: Trees that contain this node (active trees) and a list of all trees.
+        """
+        return self._enumerate_subtrees(GreedyTree._create_representation_node, GreedyRepresentationTree, filters)
+
+    def get_subtree_instances(self, filters, vocabulary):
+        """
+        Same enumeration as `get_subtrees`, that builds lightweight subtree instances (tuples) instead of
+        representation trees. Key, order and size of an instance are calculated only once, from already calculated
+        values of its children. Labels in `ignored_labels` are ignored already while creating keys.
         :param filters:
+        :param vocabulary: Vocabulary with which keys of instances are coded.
         :return:
         """
-        # a list that stores all trees
-        trees = []
-        # A tuple containing cumulative size of all children, coupled with a list of children combinations.
-        # The list contains combinations that are connected to the current node (and are relevant for further
-        # generation). Set to [[]] because you always want an empty tree containing only itself.
-        combinations = [(1, [])]
-
-        node = RepresentationNode(self, self.index, filters['create_output_string_functs'])
-        for child in self.children:
-            child_active_trees, child_trees = child.get_subtrees(filters)
-            combinations = GreedyTree._merge_combinations(combinations, child_active_trees, filters)
-            trees.extend(child_trees)
-
-        active_trees = []
-        for combination in combinations:
-            active_trees.append(GreedyRepresentationTree(node, combination, filters))
-        trees.extend(active_trees)
-        return active_trees, trees
+        return self._enumerate_subtrees(GreedyTree._create_instance_node, GreedyTree._create_instance, filters,
+                                        vocabulary)
+
+    @staticmethod
+    def _create_representation_node(tree, filters, vocabulary):
+        return RepresentationNode(tree, tree.index, filters['create_output_string_functs'])
+
+    @staticmethod
+    def _create_instance_node(tree, filters, vocabulary):
+        """
+        Creates node data of subtree instances (see `NODE_*` positions).
+        :param tree:
+        :param filters:
+        :param vocabulary:
+        :return:
+        """
+        name_parts, name = RepresentationNode.generate_name(tree, filters['create_output_string_functs'])
+        if filters['dependency_type']:
+            deprel_code = vocabulary.get_code(tree.deprel)
+            separators = (LEFT_LABELED + deprel_code, RIGHT_LABELED + deprel_code, ' >' + tree.deprel + ' ')
+        else:
+            separators = (LEFT, RIGHT, ' > ')
+        return (name_parts, name, tree.deprel, tree.index, vocabulary.get_code(name)) + separators
+
+    @staticmethod
+    def _create_instance(node, combination, filters):
+        """
+        Creates subtree instance, a tuple of (tree size, coded key, size without ignored nodes, order of nodes, node
+        data, children, string key). Children are stored in the order in which they appear in key. String key is only
+        needed to sort children when node order is not fixed, otherwise it is None (as is order of nodes when it is not
+        fixed).
+        :param node: Tuple of node data (see `NODE_*` positions).
+        :param combination: Tuple of tree size and list of children instances.
+        :param filters:
+        :return:
+        """
+        tree_size, children = combination
+        if filters['ignored_labels']:
+            children = [child for child in children if child[INSTANCE_NODE][NODE_DEPREL] not in filters['ignored_labels']]
+        if not children:
+            if filters['node_order']:
+                return tree_size, node[NODE_CODE], 1, [node[NODE_LOCATION]], node, children, None
+            return tree_size, node[NODE_CODE], 1, None, node, children, node[NODE_NAME]
+
+        size = 1
+        if filters['node_order']:
+            key_code = OPEN
+            order = []
+            write_self_node_to_result = False
+            for child in children:
+                size += child[INSTANCE_SIZE]
+                child_node = child[INSTANCE_NODE]
+                if child_node[NODE_LOCATION] < node[NODE_LOCATION]:
+                    key_code += child[INSTANCE_KEY] + child_node[NODE_LEFT_SEPARATOR]
+                else:
+                    if not write_self_node_to_result:
+                        write_self_node_to_result = True
+                        key_code += node[NODE_CODE]
+                        order.append(node[NODE_LOCATION])
+                    key_code += child_node[NODE_RIGHT_SEPARATOR] + child[INSTANCE_KEY]
+                order += child[INSTANCE_ORDER]
+            if not write_self_node_to_result:
+                key_code += node[NODE_CODE]
+                order.append(node[NODE_LOCATION])
+            return tree_size, key_code + CLOSE, size, order, node, children, None
+
+        # order of nodes is not needed when it is not fixed, children are sorted by their string keys
+        children = sorted(children, key=lambda x: (x[INSTANCE_STRING_KEY], x[INSTANCE_NODE][NODE_DEPREL]))
+        key = node[NODE_NAME]
+        key_code = OPEN + node[NODE_CODE]
+        for child in children:
+            size += child[INSTANCE_SIZE]
+            key += child[INSTANCE_NODE][NODE_STRING_SEPARATOR] + child[INSTANCE_STRING_KEY]
+            key_code += child[INSTANCE_NODE][NODE_RIGHT_SEPARATOR] + child[INSTANCE_KEY]
+        return tree_size, key_code + CLOSE, size, None, node, children, '(' + key + ')'
+
+    @staticmethod
+    def get_instance_array(instance, filters):
+        """
+        Returns array of tree elements (name parts of nodes) of a subtree instance, in the same order as in its key.
+        :param instance:
+        :param filters:
+        :return:
+        """
+        array = []
+        # pairs of instance and whether it still has to be expanded (otherwise only name parts of its node are added)
+        stack = [(instance, True)]
+        while stack:
+            instance, expand = stack.pop()
+            node = instance[INSTANCE_NODE]
+            if not expand:
+                array.append(node[NODE_NAME_PARTS])
+                continue
+            elements = []
+            write_self_node_to_result = False
+            for child in instance[INSTANCE_CHILDREN]:
+                if not write_self_node_to_result and not (
+                        filters['node_order'] and child[INSTANCE_NODE][NODE_LOCATION] < node[NODE_LOCATION]):
+                    write_self_node_to_result = True
+                    elements.append((instance, False))
+                elements.append((child, True))
+            if not write_self_node_to_result:
+                elements.append((instance, False))
+            stack.extend(reversed(elements))
+        return array
@@ -21,6 +21,8 @@ from stark.processing.filters import Filter
 
 
 class QueryTree(Tree):
+    __slots__ = ()
+
     def __init__(self, index, form, lemma, upos, xpos, deprel, head, feats_detailed, token_misc, document, summary):
         super().__init__(index, form, lemma, upos, xpos, deprel, head, feats_detailed, token_misc, document, summary)
 
@@ -36,10 +38,13 @@ class QueryTree(Tree):
         all_query_indices = []
 
         active_permanent_query_trees = []
-        for permanent_query_tree in permanent_query_trees:
+        # indices of active permanent query trees, so that their answers are stored with the right query
+        active_permanent_query_indices = []
+        for query_index, permanent_query_tree in enumerate(permanent_query_trees):
             if (self._fits_static_requirements(permanent_query_tree, filters)
                     and self._fits_permanent_requirements(filters)):
                 active_permanent_query_trees.append(permanent_query_tree)
+                active_permanent_query_indices.append(query_index)
                 if 'children' in permanent_query_tree:
                     all_query_indices.append((permanent_query_tree['children'], True))
                     # r_all_query_indices.append((permanent_query_tree['r_children'], True))
@@ -74,10 +79,10 @@ class QueryTree(Tree):
 
             i_question += 1
 
-        for i in range(len(active_permanent_query_trees)):
+        for i, query_index in enumerate(active_permanent_query_indices):
             # erase first and last brackets when adding new query result
             add_subtree = [subtree.ignore_labels(filters) for subtree in merged_partial_answers[i]]
-            complete_answers[i].extend(add_subtree)
+            complete_answers[query_index].extend(add_subtree)
 
         # answers to valid queries
         partial_answers = [[] for _ in range(len(temporary_query_trees))]
@@ -87,28 +92,14 @@ class QueryTree(Tree):
 
         return partial_answers, complete_answers
 
-    def _fits_static_requirements_feats(self, query_tree):
-        if 'feats_detailed' not in query_tree:
-            return True
-
-        for feat in query_tree['feats_detailed'].keys():
-            if (feat not in self.feats_detailed or
-                    query_tree['feats_detailed'][feat] != next(iter(self.feats_detailed[feat].values()))):
-                return False
-
-        return True
-
     def _fits_permanent_requirements(self, filters):
-        return Filter.check_root_whitelist(self.form, self.lemma, self.upos,
-                                           self.feats, self.deprel, self.misc, filters)
+        return Filter.check_root_whitelist(self, filters)
 
     def _fits_temporary_requirements(self, filters):
         return Filter.check_label_whitelist(self.deprel, filters)
 
     def _fits_static_requirements(self, query_tree, filters):
-        return Filter.check_query_tree(query_tree, self.form, self.lemma, self.upos,
-                                       self.xpos, self.feats, self.deprel,
-                                       self.children, filters)
+        return Filter.check_query_tree(query_tree, self, self.children, filters)
 
 
     @staticmethod
@@ -271,7 +262,9 @@ class QueryTree(Tree):
             partly_built_trees.extend(new_partly_built_trees)
             partly_built_trees_architecture_indices.extend(new_partly_built_trees_architecture_indices)
 
-        l_ordered_built_trees, unique_trees_architecture = [], []
+        l_ordered_built_trees = []
+        # identities of already added trees (order keys of their parts), so that duplicates are found in constant time
+        unique_trees_identities = set()
 
         if built_trees:
             # sort 3 arrays by architecture indices
@@ -281,21 +274,9 @@ class QueryTree(Tree):
             # order outputs and erase duplicates
             for tree, tree_index in zip(temp_trees, temp_trees_index):
                 new_tree_index, new_tree = (list(t) for t in zip(*sorted(zip(tree_index, tree))))
-                is_unique = True
-                for unique_tree in unique_trees_architecture:
-                    already_in = True
-                    for part_i in range(len(unique_tree)):
-                        if (len(unique_tree[part_i]) != len(new_tree[part_i])
-                                or any(unique_tree[part_i][i_unique_part].get_order_key(filters) !=
-                                       new_tree[part_i][i_unique_part].get_order_key(filters)
-                                       for i_unique_part in range(len(unique_tree[part_i])))):
-                            already_in = False
-                            break
-                    if already_in:
-                        is_unique = False
-                        break
-
-                if is_unique:
-                    unique_trees_architecture.append(new_tree)
+                tree_identity = tuple(tuple(tree_part.get_order_key(filters) for tree_part in part)
+                                      for part in new_tree)
+                if tree_identity not in unique_trees_identities:
+                    unique_trees_identities.add(tree_identity)
                     l_ordered_built_trees.append(new_tree)
         return l_ordered_built_trees
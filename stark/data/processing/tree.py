@@ -12,67 +12,146 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from stark.data.feats import FeatsBundle
+from stark.data.vocabulary import attribute_vocabulary
 from stark.utils import create_output_string_lemma
 
+ATTRIBUTE_IDS = ['form_id', 'lemma_id', 'upos_id', 'xpos_id', 'deprel_id', 'misc_id']
+# attributes that are pickled for every node (links between nodes are pickled as positions of heads)
+PICKLED_ATTRIBUTES = ATTRIBUTE_IDS + ['feats', 'children_split', 'conll', 'index']
+
 
 class Tree(object):
+    # nodes do not have __dict__, as there is one for every token of corpus
+    __slots__ = ('form_id', 'lemma_id', 'upos_id', 'xpos_id', 'deprel_id', 'misc_id', 'feats', 'parent', 'children',
+                 'children_split', 'conll', 'index')
+
     def __init__(self, index, form, lemma, upos, xpos, deprel, head, feats_detailed, misc, document, summary):
 
-        feats_dict = summary.feats_dict
-
-        if not hasattr(self, 'feats'):
-            self.feats_detailed = {}
-
-        if form not in document.form_dict:
-            document.form_dict[form] = form
-        self.form = document.form_dict[form]
-        if lemma not in document.lemma_dict:
-            document.lemma_dict[lemma] = lemma
-        self.lemma = document.lemma_dict[lemma]
-        if upos not in document.upos_dict:
-            document.upos_dict[upos] = upos
-        self.upos = document.upos_dict[upos]
-        if xpos not in document.xpos_dict:
-            document.xpos_dict[xpos] = xpos
-        self.xpos = document.xpos_dict[xpos]
-        if deprel not in document.deprel_dict:
-            document.deprel_dict[deprel] = deprel
-        self.deprel = document.deprel_dict[deprel]
-        for feat in feats_detailed.keys():
-            if feat not in feats_dict:
-                feats_dict[feat] = {}
-            if next(iter(feats_detailed[feat])) not in feats_dict[feat]:
-                feats_dict[feat][next(iter(feats_detailed[feat]))] = next(iter(feats_detailed[feat]))
-            if feat not in self.feats_detailed:
-                self.feats_detailed[feat] = {}
-            self.feats_detailed[feat][next(iter(feats_detailed[feat]))] = (
-                feats_dict)[feat][next(iter(feats_detailed[feat]))]
-
-        self.feats = {k: list(v.keys())[0] for k, v in self.feats_detailed.items()}
-        if misc not in document.misc_dict:
-            document.misc_dict[misc] = misc
-        self.misc = document.misc_dict[misc]
+        # attributes are stored as ids of attribute_vocabulary
+        self.form_id = attribute_vocabulary.get_id(form)
+        self.lemma_id = attribute_vocabulary.get_id(lemma)
+        self.upos_id = attribute_vocabulary.get_id(upos)
+        self.xpos_id = attribute_vocabulary.get_id(xpos)
+        self.deprel_id = attribute_vocabulary.get_id(deprel)
+        self.feats = FeatsBundle.from_token(feats_detailed)
+        self.misc_id = attribute_vocabulary.get_id(misc)
 
         self.parent = head
-        self.children = []
+        # leaves share an empty tuple, list is created with the first child
+        self.children = ()
         self.children_split = -1
         self.conll = None
 
         self.index = index
 
-        # for caching answers to questions
-        self.cache = {}
+    def __reduce__(self):
+        """
+        Whole sentence is pickled from its root as a flat list of node states, so that pickling does not recurse
+        through links between nodes (which fails on deep sentences). Other nodes are pickled as references to roots.
+        :return:
+        """
+        if self.parent is not None:
+            return Tree._find_node, (self.get_root(), self.index)
+        states = []
+        positions = {}
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            positions[id(node)] = len(states)
+            state = [getattr(node, attribute) for attribute in PICKLED_ATTRIBUTES]
+            for i in range(len(ATTRIBUTE_IDS)):
+                state[i] = attribute_vocabulary.pack(state[i])
+            state.append(positions[id(node.parent)] if node.parent is not None else None)
+            states.append(tuple(state))
+            stack.extend(reversed(node.children))
+        return Tree._restore_sentence, (type(self), states)
+
+    @staticmethod
+    def _restore_sentence(tree_class, states):
+        """
+        Recreates nodes of a sentence pickled by `__reduce__` and returns its root.
+        :param tree_class:
+        :param states: States of nodes in pre-order, each ending with position of its head.
+        :return:
+        """
+        nodes = []
+        for state in states:
+            node = tree_class.__new__(tree_class)
+            for attribute, value in zip(PICKLED_ATTRIBUTES, state):
+                setattr(node, attribute, value)
+            for attribute in ATTRIBUTE_IDS:
+                setattr(node, attribute, attribute_vocabulary.unpack(getattr(node, attribute)))
+            node.children = ()
+            node.parent = None
+            if state[-1] is not None:
+                node.parent = nodes[state[-1]]
+                node.parent.add_child(node)
+            nodes.append(node)
+        return nodes[0]
+
+    @staticmethod
+    def _find_node(root, index):
+        """
+        Returns node with given index from sentence of root.
+        :param root:
+        :param index:
+        :return:
+        """
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.index == index:
+                return node
+            stack.extend(node.children)
+
+    @property
+    def form(self):
+        return attribute_vocabulary.values[self.form_id]
+
+    @property
+    def lemma(self):
+        return attribute_vocabulary.values[self.lemma_id]
+
+    @property
+    def upos(self):
+        return attribute_vocabulary.values[self.upos_id]
+
+    @property
+    def xpos(self):
+        return attribute_vocabulary.values[self.xpos_id]
+
+    @property
+    def deprel(self):
+        return attribute_vocabulary.values[self.deprel_id]
+
+    @property
+    def misc(self):
+        return attribute_vocabulary.values[self.misc_id]
 
     def add_child(self, child):
-        self.children.append(child)
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
 
     def set_parent(self, parent):
         self.parent = parent
 
-    def get_unigrams(self, create_output_strings):
-        unigrams = [Tree._generate_key(self, create_output_strings, print_lemma=False)[1]]
-        for child in self.children:
-            unigrams += child.get_unigrams(create_output_strings)
+    def get_unigrams(self, create_output_strings, unigrams=None):
+        """
+        Collects unigrams of all nodes in subtree (in pre-order) without recursion.
+        :param create_output_strings:
+        :param unigrams: Optional list into which unigrams are appended.
+        :return:
+        """
+        if unigrams is None:
+            unigrams = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            unigrams.append(Tree._generate_key(node, create_output_strings, print_lemma=False)[1])
+            stack.extend(reversed(node.children))
         return unigrams
 
     def add_conll_sentence(self, conll):
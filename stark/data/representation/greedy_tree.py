@@ -14,11 +14,9 @@
 import string
 import sys
 
-import networkx as nx
-from networkx.algorithms.bipartite import hopcroft_karp_matching
-
 from stark.data.representation.tree import RepresentationTree
 from stark.processing.filters import Filter
+from stark.utils import has_perfect_matching
 
 
 class GreedyRepresentationTree(RepresentationTree):
@@ -29,6 +27,8 @@ class GreedyRepresentationTree(RepresentationTree):
         else:
             children_sorted = sorted(children[1], key=lambda x: (x.get_key(filters), x.node.node.deprel))
         super().__init__(node, children_sorted)
+        # results of `check_query` by ids of query nodes (together with query nodes, as ids may be reused)
+        self._query_matches = None
 
     @classmethod
     def copy(cls, node, children, filters):
@@ -43,14 +43,31 @@ class GreedyRepresentationTree(RepresentationTree):
         return cls(node, [tree_size, children], filters)
 
     def check_query(self, query, filters):
+        """
+        Checks whether tree fits a query node (and its children). Results are memoised, because children trees are
+        shared by many trees and are checked against the same query nodes repeatedly.
+        :param query:
+        :param filters:
+        :return:
+        """
+        if self._query_matches is None:
+            self._query_matches = {}
+        else:
+            query_match = self._query_matches.get(id(query))
+            if query_match is not None and query_match[0] is query:
+                return query_match[1]
+        result = self._check_query(query, filters)
+        self._query_matches[id(query)] = (query, result)
+        return result
+
+    def _check_query(self, query, filters):
         # compares query and children lengths
         query_length = len(query['children']) if 'children' in query else 0
         if query_length != len(self.children):
             return False
 
         # does node comparisons
-        filt = Filter.check_query_tree(query, self.node.node.form, self.node.node.lemma, self.node.node.upos, self.node.node.xpos,
-                                       self.node.node.feats, self.node.node.deprel, self.children, filters)
+        filt = Filter.check_query_tree(query, self.node.node, self.children, filters)
 
         if not filt:
             return False
@@ -58,45 +75,41 @@ class GreedyRepresentationTree(RepresentationTree):
         if not self.children:
             return True
 
-        # compares children with query nodes
-        # creates nodes for graph children nodes go from 1 on and query children go from -1 back.
-        children_nodes = list(range(1, query_length+1))
-        query_children_nodes = list(range(-query_length, 0))
-        edges = []
-        for i, child in enumerate(self.children):
-            for j, query_child in enumerate(query['children']):
-                if child.check_query(query_child, filters):
-                    edges.append((i + 1, -j - 1))
-
-        graph = nx.Graph()
-        graph.add_nodes_from(children_nodes, bipartite=1)
-        graph.add_nodes_from(query_children_nodes, bipartite=0)
-        graph.add_edges_from(edges)
+        # compares children with query nodes, every child needs a different query child that it fits
+        children_query_children = []
+        for child in self.children:
+            query_children = [j for j, query_child in enumerate(query['children'])
+                              if child.check_query(query_child, filters)]
+            if not query_children:
+                return False
+            children_query_children.append(query_children)
 
-        # hopcroft-karp algorithm efficiently finds number of connections between
-        connections = hopcroft_karp_matching(graph, children_nodes)
-        return len(connections) == query_length * 2
+        return has_perfect_matching(children_query_children)
 
     def pass_filter(self, query_trees, filters):
         """
-        Validator of filters for greedy counter.
+        Validator of filters for greedy counter. Filters are checked from the cheapest to the most expensive one.
         :return: True when representation tree passes all filters.
         """
-        # tests tree size
-        if query_trees:
-            pass_query = False
-            for query in query_trees:
-                if self.check_query(query, filters):
-                    pass_query = True
-            if not pass_query:
-                return False
-
         # drop too small trees
-        if (filters['display_size_range'][-1] and not (filters['display_size_range'][0]
-                <= self.tree_size <= filters['display_size_range'][-1])):
+        if not Filter.check_display_size(self.tree_size, filters):
             return False
 
-        return Filter.check_representation_tree(self, filters)
+        return Filter.check_representation_tree(self, filters) and self.pass_query(query_trees, filters)
+
+    def pass_query(self, query_trees, filters):
+        """
+        Checks whether tree fits any of query trees (when there are any).
+        :param query_trees:
+        :param filters:
+        :return:
+        """
+        if not query_trees:
+            return True
+        for query in query_trees:
+            if self.check_query(query, filters):
+                return True
+        return False
 
     # def get_size(self):
     #     size = 0
@@ -20,10 +20,7 @@ class RepresentationNode(object):
         self.name_parts, self.name = self.generate_name(node, create_output_strings)
         self.location = architecture_order
         self.node = node
-        for k, v in node.feats_detailed.items():
-            assert len(v.keys()) == 1
-
-        self.feats = {k: list(v.keys())[0] for k, v in node.feats_detailed.items()}
+        self.feats = node.feats
 
     def __repr__(self):
         return self.name
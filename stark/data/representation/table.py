@@ -0,0 +1,182 @@
+# Copyright 2024 CJVT
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+from collections.abc import Mapping
+
+from stark.data.vocabulary import ORDER
+
+
+class RepresentationTable(Mapping):
+    """
+    Stores counted trees in columns instead of a dictionary per tree. Every tree is a row, with its count and ids of
+    name parts of its nodes (word array) stored in arrays. Name parts and root names are interned, order letters are
+    read from keys, other (optional) values such as examples are stored in side tables that only contain rows that
+    have them.
+
+    Table is a mapping from keys to `RepresentationRow` views, which read values the same way as dictionaries of trees
+    used to, e.g. `table[key]['number']`. Values are changed only through methods of table.
+    """
+    def __init__(self):
+        # row of each key, rows are numbered in the order in which keys are added
+        self.rows = {}
+        self.numbers = array('q')
+        # ids of name parts of all rows, word array of row i is between word_array_ends[i - 1] and word_array_ends[i]
+        self.word_array_parts = array('l')
+        self.word_array_ends = array('l')
+        # ids of root names (only when they are stored)
+        self.root_names = array('l')
+        # interned name parts (tuples) and root names
+        self.values = []
+        self.value_ids = {}
+        # optional values of rows by column name and row
+        self.columns = {}
+
+    def __getitem__(self, key):
+        return RepresentationRow(self, self.rows[key], key)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _get_value_id(self, value):
+        """
+        Returns id of an interned value and interns it when needed.
+        :param value:
+        :return:
+        """
+        value_id = self.value_ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.value_ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def increment(self, key, number=1):
+        """
+        Adds number to count of an already stored tree.
+        :param key:
+        :param number:
+        :return: Row of tree or None when tree is not stored yet.
+        """
+        row = self.rows.get(key)
+        if row is not None:
+            self.numbers[row] += number
+        return row
+
+    def add(self, key, word_array, root_name=None, number=1):
+        """
+        Adds a new tree.
+        :param key:
+        :param word_array: List of name parts of nodes.
+        :param root_name: Name of root node (only when it is stored).
+        :param number:
+        :return: Row of tree.
+        """
+        row = len(self.numbers)
+        self.rows[key] = row
+        self.numbers.append(number)
+        self.word_array_parts.extend([self._get_value_id(tuple(name_parts)) for name_parts in word_array])
+        self.word_array_ends.append(len(self.word_array_parts))
+        if root_name is not None:
+            self.root_names.append(self._get_value_id(root_name))
+        return row
+
+    def get_word_array(self, row):
+        """
+        Returns list of name parts of nodes of a row.
+        :param row:
+        :return:
+        """
+        start = self.word_array_ends[row - 1] if row else 0
+        return [self.values[value_id] for value_id in self.word_array_parts[start:self.word_array_ends[row]]]
+
+    def get_value(self, row, column):
+        """
+        Returns optional value of a row.
+        :param row:
+        :param column:
+        :return:
+        """
+        return self.columns[column][row]
+
+    def set_value(self, row, column, value):
+        """
+        Sets optional value of a row.
+        :param row:
+        :param column:
+        :param value:
+        :return:
+        """
+        if column not in self.columns:
+            self.columns[column] = {}
+        self.columns[column][row] = value
+
+    def add_row(self, other, other_row, key):
+        """
+        Adds a row of other table (with all its values) under given key.
+        :param other:
+        :param other_row:
+        :param key: Key of row in this table (keys of tables with different vocabularies differ).
+        :return: Row in this table.
+        """
+        row = self.add(key, other.get_word_array(other_row),
+                       other.values[other.root_names[other_row]] if other.root_names else None,
+                       other.numbers[other_row])
+        for column, values in other.columns.items():
+            if other_row in values:
+                self.set_value(row, column, values[other_row])
+        return row
+
+
+class RepresentationRow(Mapping):
+    """
+    Read-only view of a row of `RepresentationTable`, with the same items as dictionaries of trees used to have.
+    """
+    def __init__(self, table, row, key):
+        self.table = table
+        self.row = row
+        self.key = key
+
+    def __getitem__(self, column):
+        if column == 'number':
+            return self.table.numbers[self.row]
+        if column == 'word_array':
+            return self.table.get_word_array(self.row)
+        if column == 'order_letters' and ORDER in self.key:
+            return self.key[self.key.index(ORDER) + 1:]
+        if column == 'root_name' and self.table.root_names:
+            return self.table.values[self.table.root_names[self.row]]
+        if column in self.table.columns and self.row in self.table.columns[column]:
+            return self.table.columns[column][self.row]
+        raise KeyError(column)
+
+    def __iter__(self):
+        yield 'number'
+        yield 'word_array'
+        if ORDER in self.key:
+            yield 'order_letters'
+        if self.table.root_names:
+            yield 'root_name'
+        for column, values in self.table.columns.items():
+            if self.row in values:
+                yield column
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -14,11 +14,27 @@
 import abc
 import string
 
+from stark.data.vocabulary import OPEN, CLOSE, LEFT, RIGHT, LEFT_LABELED, RIGHT_LABELED
+
 
 class RepresentationTree(object):
     def __init__(self, node, children):
         self.node = node
         self.children = children
+        self._clear_memo()
+
+    def _clear_memo(self):
+        """
+        Keys, arrays and orders of a tree are memoised, because they are requested repeatedly (also by all trees that
+        contain this one). They depend on filters, which do not change during processing.
+        :return:
+        """
+        self._key = None
+        self._key_code = None
+        self._key_code_vocabulary = None
+        self._array = None
+        self._order_key = None
+        self._array_location = None
 
     @classmethod
     @abc.abstractmethod
@@ -27,6 +43,7 @@ class RepresentationTree(object):
 
     def set_children(self, children):
         self.children = children
+        self._clear_memo()
 
     def get_grew(self):
         nodes = [self.node]
@@ -55,49 +72,30 @@ class RepresentationTree(object):
 
     def get_key_array(self, filters):
         """
-        A code that generates key and array of a tree simultaneously (for faster execution).
+        Returns key and array of a tree.
         :return:
         key: Key of a tree
         array: Array of tree elements
         """
+        return self.get_key(filters), self.get_array(filters)
 
-        array = []
-        key = ''
-        write_self_node_to_result = False
-        if self.children:
-            children = self.children
-            for child in children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    k, a = child.get_key_array(filters)
-                    array += a
-
-                    if filters['dependency_type']:
-                        separator = ' <' + child.node.node.deprel + ' '
-                    else:
-                        separator = ' < '
-                    key += k + separator
-                else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        key += self.node.name
-                        array += [self.node.name_parts]
-                    if filters['dependency_type']:
-                        separator = ' >' + child.node.node.deprel + ' '
-                    else:
-                        separator = ' > '
-                    k, a = child.get_key_array(filters)
-                    array += a
-                    key += separator + k
-
-            if not write_self_node_to_result:
-                key += self.node.name
-                array += [self.node.name_parts]
-            array = array
-            key = '(' + key + ')'
-        else:
-            array = [self.node.name_parts]
-            key = self.node.name
-        return key, array
+    def _get_post_order(self, is_calculated=None):
+        """
+        Returns subtrees (this tree included) in post-order, so that children always come before their parents. Trees
+        are collected without recursion, so that deep trees do not need a deep stack.
+        :param is_calculated: Optional function that returns True for trees whose (memoised) value is already known.
+        Such trees and their descendants are skipped.
+        :return:
+        """
+        subtrees = []
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            if is_calculated is None or not is_calculated(tree):
+                subtrees.append(tree)
+                stack.extend(tree.children)
+        subtrees.reverse()
+        return subtrees
 
     def get_key(self, filters):
         """
@@ -105,40 +103,29 @@ class RepresentationTree(object):
         :return:
         key: Key of a tree
         """
-        key = ''
-        write_self_node_to_result = False
-        if self.children:
-            children = self.children
-            for child in children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    if filters['dependency_type']:
-                        separator = ' <' + child.node.node.deprel + ' '
-                    else:
-                        separator = ' < '
-                    key += child.get_key(filters) + separator
-                else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        key += self.node.name
-                    if filters['dependency_type']:
-                        separator = ' >' + child.node.node.deprel + ' '
-                    else:
-                        separator = ' > '
-                    key += separator + child.get_key(filters)
-
-            if not write_self_node_to_result:
-                key += self.node.name
-            key = '(' + key + ')'
-        else:
-            key = self.node.name
-        return key
+        if self._key is None:
+            for tree in self._get_post_order(lambda tree: tree._key is not None):
+                tree._key = tree._create_key(filters)
+        return self._key
 
-    def get_key_sorted(self, filters):
+    def _create_key(self, filters):
+        """
+        Creates key of a tree from already calculated keys of its children.
+        :param filters:
+        :return:
+        """
+        if not self.children:
+            return self.node.name
         key = ''
         write_self_node_to_result = False
-        if self.children:
-            children = sorted(self.children, key=lambda x: x.node.name)
-            for child in children:
+        for child in self.children:
+            if filters['node_order'] and child.node.location < self.node.location:
+                if filters['dependency_type']:
+                    separator = ' <' + child.node.node.deprel + ' '
+                else:
+                    separator = ' < '
+                key += child._key + separator
+            else:
                 if not write_self_node_to_result:
                     write_self_node_to_result = True
                     key += self.node.name
@@ -146,80 +133,145 @@ class RepresentationTree(object):
                     separator = ' >' + child.node.node.deprel + ' '
                 else:
                     separator = ' > '
-                key += separator + child.get_key_sorted(filters)
+                key += separator + child._key
 
-            if not write_self_node_to_result:
-                key += self.node.name
-            key = '(' + key + ')'
-        else:
-            key = self.node.name
-        return key
+        if not write_self_node_to_result:
+            key += self.node.name
+        return '(' + key + ')'
 
-    def get_order_key(self, filters):
-        order_key = ''
+    def get_key_code(self, vocabulary, filters):
+        """
+        Returns key of a tree coded with ids of vocabulary (see `Vocabulary`).
+        :param vocabulary:
+        :param filters:
+        :return:
+        """
+        if self._key_code is None or self._key_code_vocabulary is not vocabulary:
+            for tree in self._get_post_order(
+                    lambda tree: tree._key_code is not None and tree._key_code_vocabulary is vocabulary):
+                tree._key_code = tree._create_key_code(vocabulary, filters)
+                tree._key_code_vocabulary = vocabulary
+        return self._key_code
+
+    def _create_key_code(self, vocabulary, filters):
+        """
+        Creates coded key of a tree from already calculated coded keys of its children.
+        :param vocabulary:
+        :param filters:
+        :return:
+        """
+        if not self.children:
+            return vocabulary.get_code(self.node.name)
+        key_code = OPEN
         write_self_node_to_result = False
-        if self.children:
-            for child in self.children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    if filters['dependency_type']:
-                        separator = ' <' + child.node.node.deprel + ' '
-                    else:
-                        separator = ' < '
-                    order_key += child.get_order_key(filters) + separator
+        for child in self.children:
+            if filters['node_order'] and child.node.location < self.node.location:
+                if filters['dependency_type']:
+                    separator = LEFT_LABELED + vocabulary.get_code(child.node.node.deprel)
+                else:
+                    separator = LEFT
+                key_code += child._key_code + separator
+            else:
+                if not write_self_node_to_result:
+                    write_self_node_to_result = True
+                    key_code += vocabulary.get_code(self.node.name)
+                if filters['dependency_type']:
+                    separator = RIGHT_LABELED + vocabulary.get_code(child.node.node.deprel)
                 else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        order_key += str(self.node.location)
+                    separator = RIGHT
+                key_code += separator + child._key_code
+        if not write_self_node_to_result:
+            key_code += vocabulary.get_code(self.node.name)
+        return key_code + CLOSE
+
+    def get_key_sorted(self, filters):
+        # keys of subtrees by their ids
+        keys = {}
+        for tree in self._get_post_order():
+            if tree.children:
+                key = tree.node.name
+                for child in sorted(tree.children, key=lambda x: x.node.name):
                     if filters['dependency_type']:
                         separator = ' >' + child.node.node.deprel + ' '
                     else:
                         separator = ' > '
-                    order_key += separator + child.get_order_key(filters)
-            if not write_self_node_to_result:
-                order_key += str(self.node.location)
-            order_key = '(' + order_key + ')'
-        else:
-            order_key = str(self.node.location)
-        return order_key
+                    key += separator + keys[id(child)]
+                key = '(' + key + ')'
+            else:
+                key = tree.node.name
+            keys[id(tree)] = key
+        return keys[id(self)]
 
-    def get_order(self, filters):
-        order = []
+    def get_order_key(self, filters):
+        if self._order_key is None:
+            for tree in self._get_post_order(lambda tree: tree._order_key is not None):
+                tree._order_key = tree._create_order_key(filters)
+        return self._order_key
+
+    def _create_order_key(self, filters):
+        if not self.children:
+            return str(self.node.location)
+        order_key = ''
         write_self_node_to_result = False
-        if self.children:
-            for child in self.children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    order += child.get_order(filters)
+        for child in self.children:
+            if filters['node_order'] and child.node.location < self.node.location:
+                if filters['dependency_type']:
+                    separator = ' <' + child.node.node.deprel + ' '
+                else:
+                    separator = ' < '
+                order_key += child._order_key + separator
+            else:
+                if not write_self_node_to_result:
+                    write_self_node_to_result = True
+                    order_key += str(self.node.location)
+                if filters['dependency_type']:
+                    separator = ' >' + child.node.node.deprel + ' '
                 else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        order += [self.node.location]
-                    order += child.get_order(filters)
+                    separator = ' > '
+                order_key += separator + child._order_key
+        if not write_self_node_to_result:
+            order_key += str(self.node.location)
+        return '(' + order_key + ')'
 
-            if not write_self_node_to_result:
-                order += [self.node.location]
-            order = order
-        else:
-            order = [self.node.location]
-        return order
+    def get_order(self, filters):
+        """
+        Returns locations of nodes in the order of key. A new list is returned, as callers modify it.
+        :param filters:
+        :return:
+        """
+        return list(self.get_array_location(filters))
 
     def get_array(self, filters):
+        """
+        Returns array of tree elements in the order of key. Returned list should not be modified.
+        :param filters:
+        :return:
+        """
+        if self._array is None:
+            for tree in self._get_post_order(lambda tree: tree._array is not None):
+                tree._array = tree._create_array(filters, '_array', tree.node.name_parts)
+        return self._array
+
+    def _create_array(self, filters, memo, value):
+        """
+        Creates array of values of nodes in the order of key, from already calculated arrays of children.
+        :param filters:
+        :param memo: Name of attribute in which arrays of children are memoised.
+        :param value: Value of this node.
+        :return:
+        """
         array = []
         write_self_node_to_result = False
-        if self.children:
-            for child in self.children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    array += child.get_array(filters)
-                else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        array += [self.node.name_parts]
-                    array += child.get_array(filters)
-
-            if not write_self_node_to_result:
-                array += [self.node.name_parts]
-            array = array
-        else:
-            array = [self.node.name_parts]
+        for child in self.children:
+            if filters['node_order'] and child.node.location < self.node.location:
+                array += getattr(child, memo)
+            else:
+                if not write_self_node_to_result:
+                    write_self_node_to_result = True
+                    array.append(value)
+                array += getattr(child, memo)
+        if not write_self_node_to_result:
+            array.append(value)
         return array
 
     @staticmethod
@@ -246,20 +298,12 @@ class RepresentationTree(object):
         return mapper
 
     def get_array_location(self, filters):
-        array = []
-        write_self_node_to_result = False
-        if self.children:
-            for child in self.children:
-                if filters['node_order'] and child.node.location < self.node.location:
-                    array += child.get_array_location(filters)
-                else:
-                    if not write_self_node_to_result:
-                        write_self_node_to_result = True
-                        array += [self.node.location]
-                    array += child.get_array_location(filters)
-
-            if not write_self_node_to_result:
-                array += [self.node.location]
-        else:
-            array = [self.node.location]
-        return array
+        """
+        Returns locations of nodes in the order of key. Returned list should not be modified.
+        :param filters:
+        :return:
+        """
+        if self._array_location is None:
+            for tree in self._get_post_order(lambda tree: tree._array_location is not None):
+                tree._array_location = tree._create_array(filters, '_array_location', tree.node.location)
+        return self._array_location
@@ -12,19 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from stark.data.representation.table import RepresentationTable
+from stark.data.vocabulary import ESCAPE, Vocabulary, translate_key
+
 
 class Summary(object):
     """
     A class that is used to store results of processing.
     """
     def __init__(self):
-        self.feats_dict = {}
         self.query_trees = None
+        # ids of sentences and counts of their trees (only when sentence count file is written)
         self.samples = []
         self.corpus_size = 0
         self.unigrams = {}
-        self.representation_trees = {}
+        self.representation_trees = RepresentationTable()
         self.max_tree_size = 0
+        # strings used in (coded) keys of representation_trees
+        self.vocabulary = Vocabulary()
 
     def set_query_trees(self, query_trees):
         """
@@ -34,13 +39,124 @@ class Summary(object):
         """
         self.query_trees = query_trees
 
+    @staticmethod
+    def replaces_example(example, other_example):
+        """
+        Decides whether other_example should replace example of a tree. Sentences shorter than 15 tokens are kept,
+        otherwise the shorter sentence is preferred.
+        :param example: Tuple (sentence_id, recreated_sentence, sentence_conll, sentence_size).
+        :param other_example: Tuple of the same form.
+        :return:
+        """
+        return example[3] >= 15 and example[3] > other_example[3]
+
+    def merge(self, other, filters):
+        """
+        Adds results of other summary to this one. Counts are summed and sentences (samples and detailed results)
+        are appended after the ones already in this summary. Merging is associative, so summaries of consecutive
+        parts of a corpus may be merged in any grouping and give the same results as processing corpus at once. It
+        is also commutative, except for choosing among equally good examples, where the earlier summary wins.
+        Other summary should not be used after merging, as its trees may be reused.
+        :param other: Summary that is merged into this one.
+        :param filters:
+        :return: This summary.
+        """
+        if self.query_trees is None:
+            self.query_trees = other.query_trees
+        self.corpus_size += other.corpus_size
+        self.max_tree_size = max(self.max_tree_size, other.max_tree_size)
+        for unigram, number in other.unigrams.items():
+            self.unigrams[unigram] = self.unigrams.get(unigram, 0) + number
+
+        table = self.representation_trees
+        other_table = other.representation_trees
+        mapping = None
+        if other.vocabulary is not self.vocabulary:
+            # translate keys of other summary to ids of this vocabulary
+            mapping = self.vocabulary.get_mapping(other.vocabulary)
+            self.samples.extend((sentence_id, {translate_key(key, mapping): number for key, number in counts.items()})
+                                for sentence_id, counts in other.samples)
+        else:
+            self.samples.extend(other.samples)
+
+        for other_key, other_row in other_table.rows.items():
+            key = translate_key(other_key, mapping) if mapping is not None else other_key
+            row = table.increment(key, other_table.numbers[other_row])
+            if row is None:
+                table.add_row(other_table, other_row, key)
+            elif filters['detailed_results_file']:
+                table.get_value(row, 'sentence').extend(other_table.get_value(other_row, 'sentence'))
+            elif filters['example'] and self.replaces_example(table.get_value(row, 'sentence')[0],
+                                                              other_table.get_value(other_row, 'sentence')[0]):
+                table.set_value(row, 'sentence', other_table.get_value(other_row, 'sentence'))
+
+        return self
+
+    @classmethod
+    def reduce(cls, summaries, filters):
+        """
+        Merges a list of summaries pairwise (as a tree reduction), keeping their order.
+        :param summaries: Summaries of consecutive parts of a corpus.
+        :param filters:
+        :return: Merged summary.
+        """
+        if not summaries:
+            return cls()
+        summaries = list(summaries)
+        while len(summaries) > 1:
+            merged_summaries = [summaries[i].merge(summaries[i + 1], filters) for i in range(0, len(summaries) - 1, 2)]
+            if len(summaries) % 2:
+                merged_summaries.append(summaries[-1])
+            summaries = merged_summaries
+        return summaries[0]
+
+    @staticmethod
+    def get_query_code(vocabulary, query_index):
+        """
+        Returns code with which keys of trees of a query are prefixed, when results of multiple queries are counted in a
+        single pass (see `split_queries`).
+        :param vocabulary:
+        :param query_index: Index of query in query trees.
+        :return:
+        """
+        return vocabulary.get_code(f'query {query_index}')
+
+    def split_queries(self):
+        """
+        Splits summary of multiple queries counted in a single pass, whose keys are prefixed with codes of queries (see
+        `get_query_code`), into summaries of single queries. Other results (corpus size, unigrams) are shared by all of
+        them.
+        :return: Summaries in the order of query trees.
+        """
+        query_indices = {self.get_query_code(self.vocabulary, i): i for i in range(len(self.query_trees))}
+        summaries = []
+        for query_tree in self.query_trees:
+            summary = Summary()
+            summary.query_trees = [query_tree]
+            summary.corpus_size = self.corpus_size
+            summary.unigrams = self.unigrams
+            summary.max_tree_size = self.max_tree_size
+            summary.vocabulary = self.vocabulary
+            summary.samples = [(sentence_id, {}) for sentence_id, _ in self.samples]
+            summaries.append(summary)
+
+        for key, row in self.representation_trees.rows.items():
+            code = key[:3] if key[0] == ESCAPE else key[0]
+            summaries[query_indices[code]].representation_trees.add_row(self.representation_trees, row,
+                                                                        key[len(code):])
+        for sentence_index, (_, counts) in enumerate(self.samples):
+            for key, number in counts.items():
+                code = key[:3] if key[0] == ESCAPE else key[0]
+                summaries[query_indices[code]].samples[sentence_index][1][key[len(code):]] = number
+        return summaries
+
     def get_summary_data(self):
         """
         A function that returns summary data used for storing cache.
         :return:
         """
-        return (self.representation_trees, self.unigrams, self.corpus_size, self.feats_dict,
-                self.samples, self.max_tree_size, self.query_trees)
+        return (self.representation_trees, self.unigrams, self.corpus_size,
+                self.samples, self.max_tree_size, self.query_trees, self.vocabulary)
 
     @classmethod
     def create_summary_from_cache(cls, sum_data):
@@ -50,8 +166,8 @@ class Summary(object):
         :return:
         """
         s = cls()
-        s.representation_trees, s.unigrams, s.corpus_size, s.feats_dict, s.samples, s.max_tree_size, s.query_trees = (
-            sum_data)
+        (s.representation_trees, s.unigrams, s.corpus_size, s.samples, s.max_tree_size, s.query_trees,
+         s.vocabulary) = sum_data
         return s
 
     # def get_size_representation_trees(self):
@@ -0,0 +1,219 @@
+# Copyright 2024 CJVT
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from contextlib import contextmanager
+
+# characters that code structure of keys (ids are coded with characters from FIRST_ID_CHARACTER on)
+OPEN, CLOSE, LEFT, RIGHT, LEFT_LABELED, RIGHT_LABELED, ORDER, ESCAPE = (chr(i) for i in range(8))
+STRUCTURE = {OPEN: '(', CLOSE: ')', LEFT: ' < ', RIGHT: ' > '}
+FIRST_ID_CHARACTER = 8
+# number of ids that are coded with a single character
+SINGLE_CHARACTER_IDS = 0x110000 - FIRST_ID_CHARACTER
+
+
+class Vocabulary(object):
+    """
+    Interns strings used in keys of subtrees (names of nodes and dependency relations) as integer ids.
+
+    Keys of subtrees are coded as short strings, where every id is a single character (two characters after ESCAPE
+    for very large vocabularies) and structure of a key is coded with characters OPEN, CLOSE, LEFT and RIGHT (or
+    LEFT_LABELED and RIGHT_LABELED followed by id of dependency relation). Parts of a coded key are in the same order
+    as in its string form, e.g. `(ADJ <amod NOUN)` is coded as OPEN, ADJ, LEFT_LABELED, amod, NOUN, CLOSE. Such keys are
+    much shorter than string forms and their hashes are cached. When node order is fixed, keys of summary also contain
+    ORDER and order letters at the end.
+    """
+    def __init__(self):
+        self.values = []
+        self.codes = []
+        self.ids = {}
+
+    def get_id(self, value):
+        """
+        Returns id of a string and adds it to vocabulary when needed.
+        :param value:
+        :return:
+        """
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+            if value_id < SINGLE_CHARACTER_IDS:
+                self.codes.append(chr(FIRST_ID_CHARACTER + value_id))
+            else:
+                self.codes.append(ESCAPE + chr(FIRST_ID_CHARACTER + value_id // SINGLE_CHARACTER_IDS) +
+                                  chr(FIRST_ID_CHARACTER + value_id % SINGLE_CHARACTER_IDS))
+        return value_id
+
+    def get_code(self, value):
+        """
+        Returns code of a string (used in coded keys) and adds it to vocabulary when needed.
+        :param value:
+        :return:
+        """
+        return self.codes[self.get_id(value)]
+
+    def get_mapping(self, other):
+        """
+        Returns dictionary that maps codes of other vocabulary to codes of this one. Missing strings are added.
+        :param other:
+        :return:
+        """
+        return {code: self.get_code(value) for code, value in zip(other.codes, other.values)}
+
+    def get_lookup_mapping(self, other):
+        """
+        Returns dictionary that maps codes of this vocabulary to codes of other one (only for strings that are in
+        both).
+        :param other:
+        :return:
+        """
+        return {code: other.codes[other.ids[value]] for code, value in zip(self.codes, self.values)
+                if value in other.ids}
+
+    def render_key(self, key):
+        """
+        Returns string form of a coded key and its order letters (empty, when they are not part of key).
+        :param key:
+        :return:
+        """
+        rendered = []
+        i = 0
+        while i < len(key):
+            character = key[i]
+            if character in STRUCTURE:
+                rendered.append(STRUCTURE[character])
+            elif character == LEFT_LABELED or character == RIGHT_LABELED:
+                i, value_id = self._read_id(key, i + 1)
+                separator = ' <' if character == LEFT_LABELED else ' >'
+                rendered.append(separator + self.values[value_id] + ' ')
+            elif character == ORDER:
+                return ''.join(rendered), key[i + 1:]
+            else:
+                i, value_id = self._read_id(key, i)
+                rendered.append(self.values[value_id])
+            i += 1
+        return ''.join(rendered), ''
+
+    @staticmethod
+    def _read_id(key, i):
+        """
+        Reads id at position i of a coded key.
+        :param key:
+        :param i:
+        :return: Position of last character of id and id.
+        """
+        if key[i] == ESCAPE:
+            return i + 2, ((ord(key[i + 1]) - FIRST_ID_CHARACTER) * SINGLE_CHARACTER_IDS +
+                           ord(key[i + 2]) - FIRST_ID_CHARACTER)
+        return i, ord(key[i]) - FIRST_ID_CHARACTER
+
+
+def translate_key(key, mapping):
+    """
+    Translates codes of ids in a coded key with mapping. Returns None when a code is not mapped.
+    :param key:
+    :param mapping: Dictionary that maps old codes to new ones.
+    :return:
+    """
+    translated = []
+    i = 0
+    while i < len(key):
+        character = key[i]
+        if character == ORDER:
+            translated.append(key[i:])
+            break
+        if character in STRUCTURE or character == LEFT_LABELED or character == RIGHT_LABELED:
+            translated.append(character)
+            i += 1
+            continue
+        code = key[i:i + 3] if character == ESCAPE else character
+        if code not in mapping:
+            return None
+        translated.append(mapping[code])
+        i += len(code)
+    return ''.join(translated)
+
+
+class AttributeVocabulary(object):
+    """
+    Interns values of node attributes (form, lemma, upos, xpos, deprel and misc) as integer ids. A single vocabulary
+    is used by all documents of a process, so values are shared across files.
+
+    Processes of a pool share ids of values that were in vocabulary when pool was created (`shared_size`). Ids of
+    trees sent between processes are pickled as they are when they are shared, other values are pickled as strings and
+    interned again in the receiving process (see `pack` and `unpack`).
+    """
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+        self.shared_size = 0
+
+    def get_id(self, value):
+        """
+        Returns id of a value and adds it to vocabulary when needed.
+        :param value:
+        :return:
+        """
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def share(self, values=None):
+        """
+        Marks all values as shared with worker processes. Workers call it with values of vocabulary of the process that
+        created them (workers that are forked already have them).
+        :param values:
+        :return:
+        """
+        if values is not None and values is not self.values:
+            self.values = list(values)
+            self.ids = {value: value_id for value_id, value in enumerate(self.values)}
+        self.shared_size = len(self.values)
+
+    @contextmanager
+    def private(self):
+        """
+        Context in which all values are pickled as strings, e.g. for caches that are read by other runs.
+        :return:
+        """
+        shared_size = self.shared_size
+        self.shared_size = 0
+        try:
+            yield
+        finally:
+            self.shared_size = shared_size
+
+    def pack(self, value_id):
+        """
+        Returns form of id that is pickled.
+        :param value_id:
+        :return:
+        """
+        return value_id if value_id < self.shared_size else self.values[value_id]
+
+    def unpack(self, packed):
+        """
+        Returns id of a pickled id or value.
+        :param packed:
+        :return:
+        """
+        return packed if isinstance(packed, int) else self.get_id(packed)
+
+
+# vocabulary of node attributes of current process
+attribute_vocabulary = AttributeVocabulary()
@@ -14,16 +14,21 @@
 
 import hashlib
 import os
+import pickle
 
 import logging
 from pathlib import Path
 
 from stark.data.document import Document
 from stark.data.summary import Summary
+from stark.data.vocabulary import attribute_vocabulary
 from stark.utils import load_zipped_pickle, save_zipped_pickle
 
 logger = logging.getLogger('stark')
 
+# stored in front of cached trees, caches of other formats (also ones without header) are created again
+DOCUMENT_CACHE_HEADER = b'STARK document cache 2\n'
+
 
 class ProcessorCache(object):
     """
@@ -47,18 +52,21 @@ class ProcessorCache(object):
             if self._checkpoint_path is not None and self._checkpoint_path.exists():
                 os.remove(self._checkpoint_path)
         else:
-            return self._load_cache()
+            return self._load_cache(summary)
         return summary
 
-    def _load_cache(self):
+    def _load_cache(self, summary):
         """
         Actually loads cache.
+        :param summary: Summary of current run.
         :return:
         summary: Loaded summary
         """
         self.already_processed, summary_data = load_zipped_pickle(self._checkpoint_path)
-        summary = Summary.create_summary_from_cache(summary_data)
-        return summary
+        loaded_summary = Summary.create_summary_from_cache(summary_data)
+        # query trees contain ids of attributes, which are valid only in the run that created them
+        loaded_summary.set_query_trees(summary.query_trees)
+        return loaded_summary
 
     def _save_cache(self, summary):
         """
@@ -70,6 +78,28 @@ class ProcessorCache(object):
             (self.already_processed, summary_data),
             self._checkpoint_path, protocol=2)
 
+    def is_processed(self, path):
+        """
+        Checks whether document was already processed.
+        :param path: Path to document.
+        :return:
+        """
+        if str(path) in self.already_processed:
+            logger.info(f'Skipping: {str(path)}')
+            return True
+        return False
+
+    def mark_processed(self, path, summary):
+        """
+        Marks document as processed and stores summary in cache.
+        :param path: Path to document.
+        :param summary: Processing summary that already contains results of document.
+        :return:
+        """
+        self.already_processed.add(str(path))
+        if self._checkpoint_path:
+            self._save_cache(summary)
+
     def process_trees(self, path, summary):
         """
         Skips documents that were already processed and stores processed results in cache.
@@ -78,14 +108,11 @@ class ProcessorCache(object):
         :return:
         summary: A collection of datapoints used for result generation.
         """
-        if str(path) in self.already_processed:
-            logger.info(f'Skipping: {str(path)}')
+        if self.is_processed(path):
             return summary
 
         summary = self.processor.run(path, summary)
-        self.already_processed.add(str(path))
-        if self._checkpoint_path:
-            self._save_cache(summary)
+        self.mark_processed(path, summary)
 
         return summary
 
@@ -99,27 +126,61 @@ class DocumentCache(object):
         configs = document_processor.processor.configs
         self.document_processor = document_processor
         self.path = path
-        self._internal_file = os.path.join(configs['internal_saves'], hashlib.sha1(path.encode('utf-8')).hexdigest()) \
+        internal_file = os.path.join(configs['internal_saves'], hashlib.sha1(path.encode('utf-8')).hexdigest()) \
             if configs['internal_saves'] is not None else None
-        # do not save cache if input is dir
-        self._save = not os.path.isdir(configs['input_path'])
+        # greedy and query counter use different trees, so they are stored separately
+        tree_type = 'greedy' if configs['greedy_counter'] else 'query'
+        self._internal_file = f'{internal_file}_{tree_type}' if internal_file is not None else None
+        # do not save cache if input is dir or when only a part of file is processed
+        self._save = not os.path.isdir(configs['input_path']) and document_processor.byte_range is None
+        # index does not contain trees, so it is the same for both counters
+        self._index_file = internal_file + '.index' \
+            if internal_file is not None and document_processor.byte_range is None else None
 
     def create_trees(self, summary, configs):
-        if self._internal_file is None or not os.path.exists(self._internal_file) or not self._save:
+        document = None
+        if self._internal_file is not None and os.path.exists(self._internal_file) and self._save:
+            document = self._load_cache(summary)
+        if document is None:
             document = self.document_processor.create_trees(summary, configs)
 
             if self._internal_file is not None and self._save:
                 self._save_cache(document, summary)
-        else:
-            document = self._load_cache(summary)
+
+        # index is only used by query counter
+        if not configs['greedy_counter'] and self._index_file is not None and os.path.exists(self._index_file):
+            document.index = self._load_index(document, configs)
 
         return document
 
+    def save_index(self, index):
+        """
+        Stores inverted index of document.
+        :param index:
+        :return:
+        """
+        if self._index_file is None:
+            raise ValueError('`internal_saves` has to be set to create index!')
+        # arrays of positions are compressed almost as well with the fastest level
+        save_zipped_pickle(index, self._index_file, protocol=pickle.HIGHEST_PROTOCOL, compresslevel=1)
+
+    def _load_index(self, document, configs):
+        index = load_zipped_pickle(self._index_file)
+        if not index.is_valid(document, self.path, configs):
+            logger.warning(f'Index of {self.path} is not used, as file or settings changed since it was created')
+            return None
+        return index
+
     def _save_cache(self, document, summary):
-        document_data = document.get_document_data() + [summary.corpus_size, summary.feats_dict]
-        save_zipped_pickle(document_data, self._internal_file, protocol=2)
+        document_data = document.get_document_data() + [summary.corpus_size]
+        # ids of attributes are valid only in this run
+        with attribute_vocabulary.private():
+            save_zipped_pickle(document_data, self._internal_file, protocol=2, header=DOCUMENT_CACHE_HEADER)
 
     def _load_cache(self, summary):
-        document_data = load_zipped_pickle(self._internal_file)
-        summary.corpus_size, summary.feats_dict = document_data[-2:]
-        return Document.create_document_from_cache(document_data[:-2])
+        document_data = load_zipped_pickle(self._internal_file, header=DOCUMENT_CACHE_HEADER)
+        if document_data is None:
+            logger.info(f'Cache of {self.path} has a different format and is created again')
+            return None
+        summary.corpus_size = document_data[-1]
+        return Document.create_document_from_cache(document_data[:-1])
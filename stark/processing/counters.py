@@ -12,83 +12,308 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import gc
+import logging
 import random
+import time
 from abc import abstractmethod
+from contextlib import contextmanager
 from multiprocessing import Pool
 from tqdm import tqdm
 
+from stark.data.processing.greedy_tree import GreedyTree, INSTANCE_KEY, INSTANCE_SIZE, INSTANCE_ORDER, INSTANCE_NODE, \
+    NODE_NAME
+from stark.data.representation.tree import RepresentationTree
+from stark.data.summary import Summary
+from stark.data.vocabulary import ORDER, attribute_vocabulary
+from stark.processing.filters import QueryPrefilter
+
+logger = logging.getLogger('stark')
+
+# data that is installed into each worker process only once (instead of sending it with every sentence)
+_worker_data = {}
+
+
+@contextmanager
+def keep_open(pool):
+    """
+    Context of a long-lived pool, which (unlike pool's own context) does not terminate pool on exit.
+    :param pool:
+    :return:
+    """
+    yield pool
+
+
+def initialize_worker(counter_class, query_trees, filters, configs, attribute_values):
+    """
+    Stores data shared by all tasks of a worker process.
+    :param counter_class: Counter class whose `tree_calculations` is executed in worker.
+    :param query_trees:
+    :param filters:
+    :param configs:
+    :param attribute_values: Values of attribute vocabulary of the process that created pool.
+    :return:
+    """
+    attribute_vocabulary.share(attribute_values)
+    _worker_data['counter_class'] = counter_class
+    _worker_data['query_trees'] = query_trees
+    _worker_data['filters'] = filters
+    _worker_data['configs'] = configs
+
+
+def worker_tree_calculations(sentence):
+    """
+    Executes `sentence_calculations` of a counter on a single sentence in a worker process.
+    :param sentence: A tuple of list of roots of a sentence and nodes from which its subtrees are searched.
+    :return:
+    """
+    tree, heads = sentence
+    return _worker_data['counter_class'].sentence_calculations((tree, _worker_data['query_trees'],
+                                                                _worker_data['filters']), heads)
+
+
+def worker_count_sentences(chunk):
+    """
+    Counts a chunk of sentences in a worker process and returns partial results.
+    :param chunk: A tuple of lists of trees, their sentence statistics (as packed by `Counter.pack_sentences`) and
+    nodes from which their subtrees are searched.
+    :return: Summary that contains results of chunk only.
+    """
+    trees, packed_sentences, sentences_heads = chunk
+    sentences = _worker_data['counter_class'].unpack_sentences(packed_sentences, len(trees), _worker_data['filters'])
+    summary = Summary()
+    summary.set_query_trees(_worker_data['query_trees'])
+    counter = _worker_data['counter_class']([], summary, _worker_data['filters'], _worker_data['configs'])
+    for tree, sentence, heads in zip(trees, sentences, sentences_heads):
+        counter.count_sentence(tree, sentence, heads)
+    counter.add_samples(sentences)
+    return summary
+
 
 class Counter(object):
     """
     A class designed for counting subtrees.
     """
-    def __init__(self, document, summary, filters, configs):
-        self.document = document
+    def __init__(self, documents, summary, filters, configs, pool=None):
+        self.documents = documents
         self.summary = summary
         self.filters = filters
         self.configs = configs
+        self.pool = pool
+        # prefilter of sentences, created when counting starts
+        self.prefilter = None
 
     def run(self):
         """
         Starts counting.
         :return:
         """
-        if self.filters['cpu_cores'] > 1:
+        start_time = time.time()
+        self.sentences_number = 0
+        self.skipped_sentences_number = 0
+        self.prefilter = self.create_prefilter()
+        if self.filters['cpu_cores'] > 1 and self.configs['worker_aggregation']:
+            self.run_multiprocessor_aggregation()
+        elif self.filters['cpu_cores'] > 1:
             self.run_multiprocessor()
         else:
             self.run_single_processor()
+        duration = time.time() - start_time
+        logger.info(f"{self.sentences_number} sentences counted "
+                    f"({self.sentences_number / duration if duration else 0:.1f} sentences/sec)")
+        if self.prefilter is not None:
+            logger.info(f"{self.skipped_sentences_number} sentences skipped by query prefilter")
+
+    def get_sentences_number(self):
+        """
+        Returns number of sentences when it is known in advance (it is not when documents are streamed).
+        :return:
+        """
+        if isinstance(self.documents, list):
+            return sum(len(document.trees) for document in self.documents)
+        return None
 
     @staticmethod
     @abstractmethod
     def tree_calculations(input_data):
         return []
 
+    def create_prefilter(self):
+        """
+        Returns prefilter of sentences (see `QueryPrefilter`) or None, when all sentences are counted.
+        :return:
+        """
+        return None
+
+    def get_heads(self, document):
+        """
+        Returns nodes of every sentence of document from which its subtrees are searched. These are roots of sentences
+        that pass prefilter and no nodes for the ones that do not (they are counted as skipped).
+        :param document:
+        :return:
+        """
+        if self.prefilter is None:
+            return document.trees
+        sentences_heads = [tree if self.prefilter.check(mask, len(sentence['tokens'])) else []
+                           for tree, mask, sentence in zip(document.trees, document.sentence_masks,
+                                                           document.sentence_statistics)]
+        self.skipped_sentences_number += sum(1 for tree, heads in zip(document.trees, sentences_heads)
+                                             if tree and not heads)
+        return sentences_heads
+
+    def open_pool(self):
+        """
+        Returns context with pool of worker processes. Given (long-lived) pool is left open, otherwise a temporary one
+        is created.
+        :return:
+        """
+        if self.pool is not None:
+            return keep_open(self.pool)
+        attribute_vocabulary.share()
+        return Pool(self.filters['cpu_cores'], initializer=initialize_worker,
+                    initargs=(type(self), self.summary.query_trees, self.filters, self.configs,
+                              attribute_vocabulary.values))
+
     def run_multiprocessor(self):
         """
         Runs processing on multiple cores.
         :return:
         """
-        with Pool(self.filters['cpu_cores']) as p:
-            all_unigrams = p.map(self.get_unigrams,
-                                 [(tree, self.filters) for tree in self.document.trees])
-            for unigrams in all_unigrams:
-                for unigram in unigrams:
-                    if unigram in self.summary.unigrams:
-                        self.summary.unigrams[unigram] += 1
-                    else:
-                        self.summary.unigrams[unigram] = 1
-
-            i = 0
-            with tqdm(desc='Creating subtrees', total=len(self.document.trees)) as pbar:
-                for subtrees in p.imap(self.tree_calculations,
-                                                [(tree, self.summary.query_trees, self.filters) for tree in self.document.trees]):
-
-                    for subtree in subtrees:
-                        self.postprocess_query_results(subtree, self.document.sentence_statistics[i])
-                    i += 1
-                    pbar.update()
-                    # if i % 1000 == 0:
-                    #     gc.collect()
+        with self.open_pool() as p:
+            with tqdm(desc='Creating subtrees', total=self.get_sentences_number(), unit=' sentences') as pbar:
+                for document in self.documents:
+                    sentences_heads = self.get_heads(document)
+                    # skipped sentences are not sent to workers
+                    results = p.imap(worker_tree_calculations,
+                                     [(tree, heads) for tree, heads in zip(document.trees, sentences_heads) if heads],
+                                     chunksize=self.configs['chunk_size'])
+                    for tree, sentence, heads in zip(document.trees, document.sentence_statistics, sentences_heads):
+                        if heads:
+                            unigrams, subtrees = next(results)
+                            self.add_unigrams(unigrams)
+                            self.postprocess_subtrees(subtrees, sentence)
+                        else:
+                            self.count_sentence(tree, sentence, heads)
+                        pbar.update()
+                    self.sentences_number += len(document.trees)
+                    self.add_samples(document.sentence_statistics)
+
+    def run_multiprocessor_aggregation(self):
+        """
+        Runs processing on multiple cores, where each worker counts a whole chunk of sentences into its own summary.
+        Main process only merges partial summaries.
+        :return:
+        """
+        chunk_size = self.configs['chunk_size']
+        with self.open_pool() as p:
+            with tqdm(desc='Creating subtrees', total=self.get_sentences_number(), unit=' sentences') as pbar:
+                for document in self.documents:
+                    sentences_heads = self.get_heads(document)
+                    chunks = [(document.trees[i:i + chunk_size],
+                               self.pack_sentences(document.sentence_statistics[i:i + chunk_size], self.filters),
+                               sentences_heads[i:i + chunk_size]) for i in range(0, len(document.trees), chunk_size)]
+                    for chunk, chunk_summary in zip(chunks, p.imap(worker_count_sentences, chunks)):
+                        self.summary.merge(chunk_summary, self.filters)
+                        pbar.update(len(chunk[0]))
+                    self.sentences_number += len(document.trees)
+
+    @staticmethod
+    def pack_sentences(sentences, filters):
+        """
+        Returns only those sentence statistics of a chunk that are needed for counting it in a worker process. Whole
+        statistics (with tokens) are only needed for examples and detailed results, ids of sentences for sentence count
+        file and nothing otherwise.
+        :param sentences: Sentence statistics.
+        :param filters:
+        :return:
+        """
+        if filters['example'] or filters['detailed_results_file']:
+            return sentences
+        if filters['sentence_count_file']:
+            return [sentence['id'] for sentence in sentences]
+        return None
+
+    @staticmethod
+    def unpack_sentences(packed_sentences, sentences_number, filters):
+        """
+        Recreates sentence statistics of a chunk packed by `pack_sentences`, with empty counts of trees.
+        :param packed_sentences:
+        :param sentences_number: Number of sentences in chunk.
+        :param filters:
+        :return:
+        """
+        if filters['example'] or filters['detailed_results_file']:
+            return packed_sentences
+        if filters['sentence_count_file']:
+            return [{'id': sentence_id, 'count': {}} for sentence_id in packed_sentences]
+        return [{} for _ in range(sentences_number)]
 
     def run_single_processor(self):
         """
         Runs processing on single core.
         :return:
         """
-        for tree, sentence in tqdm(zip(self.document.trees, self.document.sentence_statistics), desc='Processing',
-                                   total=len(self.document.trees)):
-            input_data = (tree, self.summary.query_trees, self.filters)
+        with tqdm(desc='Processing', total=self.get_sentences_number(), unit=' sentences') as pbar:
+            for document in self.documents:
+                for tree, sentence, heads in zip(document.trees, document.sentence_statistics,
+                                                 self.get_heads(document)):
+                    self.count_sentence(tree, sentence, heads)
+                    pbar.update()
+                self.sentences_number += len(document.trees)
+                self.add_samples(document.sentence_statistics)
+
+    def count_sentence(self, tree, sentence, heads=None):
+        """
+        Counts unigrams (when needed) and subtrees of a single sentence and stores them into summary.
+        :param tree: List of roots of a sentence.
+        :param sentence: Sentence statistics.
+        :param heads: Nodes from which subtrees are searched (see `get_heads`), roots when not given. Only unigrams
+        are counted when there are none.
+        :return:
+        """
+        if heads is None:
+            heads = tree
+        if not heads:
             if self.filters['association_measures']:
-                unigrams = self.get_unigrams((tree, self.filters))
-                for unigram in unigrams:
-                    if unigram in self.summary.unigrams:
-                        self.summary.unigrams[unigram] += 1
-                    else:
-                        self.summary.unigrams[unigram] = 1
+                self.add_unigrams(self.get_unigrams((tree, self.filters)))
+            return
+        unigrams, subtrees = self.sentence_calculations((tree, self.summary.query_trees, self.filters), heads)
+        self.add_unigrams(unigrams)
+        self.postprocess_subtrees(subtrees, sentence)
 
-            subtrees = self.tree_calculations(input_data)
-            for subtree in subtrees:
-                self.postprocess_query_results(subtree, sentence)
+    def add_samples(self, sentences):
+        """
+        Stores ids of counted sentences and counts of their trees into summary, when they are written into sentence
+        count file. Other sentence statistics (e.g. tokens) are not kept after sentences are counted.
+        :param sentences: Sentence statistics.
+        :return:
+        """
+        if self.filters['sentence_count_file']:
+            self.summary.samples.extend((sentence['id'], sentence['count']) for sentence in sentences)
+
+    def add_unigrams(self, unigrams):
+        """
+        Adds unigrams of a sentence to summary.
+        :param unigrams:
+        :return:
+        """
+        for unigram in unigrams:
+            if unigram in self.summary.unigrams:
+                self.summary.unigrams[unigram] += 1
+            else:
+                self.summary.unigrams[unigram] = 1
+
+    @classmethod
+    def sentence_calculations(cls, input_data, heads=None):
+        """
+        Collects unigrams (only when association measures need them) and subtrees of a single sentence, so that
+        corpus is traversed only once.
+        :param input_data: A tuple containing tree, query trees and filters.
+        :param heads: Nodes from which subtrees are searched, roots of tree when not given.
+        :return: A tuple of unigrams and subtrees.
+        """
+        tree, query_trees, filters = input_data
+        unigrams = cls.get_unigrams((tree, filters)) if filters['association_measures'] else []
+        return unigrams, cls.tree_calculations((tree if heads is None else heads, query_trees, filters))
 
     @staticmethod
     def get_unigrams(input_data):
@@ -101,7 +326,7 @@ class Counter(object):
         unigrams = []
         # there might be multiple roots in a sentence/tree
         for tree_root in tree:
-            unigrams += tree_root.get_unigrams(filters['create_output_string_functs'])
+            tree_root.get_unigrams(filters['create_output_string_functs'], unigrams)
         return unigrams
 
     def recreate_sentence(self, sentence, r):
@@ -125,65 +350,73 @@ class Counter(object):
                 recreated_sentence += ' '
         return recreated_sentence, subtree_node_positions
 
-    def postprocess_query_results(self, r, sentence):
+    def postprocess_subtrees(self, subtrees, sentence):
+        """
+        Stores subtrees of a sentence (results of `tree_calculations`) into Summary object.
+        :param subtrees:
+        :param sentence:
+        :return:
+        """
+        for subtree in subtrees:
+            self.postprocess_query_results(subtree, sentence)
+
+    def postprocess_query_results(self, r, sentence, key_prefix=''):
         """
         Gathers processing results, formats and stores them into Summary object.
         :param r:
         :param sentence:
+        :param key_prefix: Code that is prepended to key of tree (see `Summary.get_query_code`).
         :return:
         """
-        key_raw, word_array = r.get_key_array(self.filters)
         if self.filters['ignored_labels']:
             if self.filters['display_size_range'][0] and \
-                    (len(word_array) > self.filters['display_size_range'][-1] or len(word_array) <
-                     self.filters['display_size_range'][0]):
+                    (len(r.get_array(self.filters)) > self.filters['display_size_range'][-1] or
+                     len(r.get_array(self.filters)) < self.filters['display_size_range'][0]):
                 return
+        key_code = key_prefix + r.get_key_code(self.summary.vocabulary, self.filters)
         if self.filters['node_order']:
             order_letters = r.get_order_letters(r.get_order(self.filters))
-            key = key_raw + order_letters
+            key = key_code + ORDER + order_letters
         else:
-            key = key_raw
+            key = key_code
         sentence_size = len(sentence['tokens']) if 'tokens' in sentence else 10000
-        if key in self.summary.representation_trees:
+        table = self.summary.representation_trees
+        row = table.increment(key)
+        if row is not None:
             if self.filters['detailed_results_file']:
                 recreated_sentence, subtree_node_positions = self.recreate_sentence(sentence, r)
                 sentence_conll = (r.node.node.get_root().conll, subtree_node_positions) if self.filters['annodoc'] else None
 
-                self.summary.representation_trees[key]['sentence'].append((sentence['id'],
-                                                                           recreated_sentence,
-                                                                           sentence_conll,
-                                                                           sentence_size))
-            elif self.filters['example'] and self.summary.representation_trees[key]['sentence'][0][
-                3] >= 15 and self.summary.representation_trees[key]['sentence'][0][3] > sentence_size:
+                table.get_value(row, 'sentence').append((sentence['id'],
+                                                         recreated_sentence,
+                                                         sentence_conll,
+                                                         sentence_size))
+            elif self.filters['example'] and self.summary.replaces_example(
+                    table.get_value(row, 'sentence')[0], (None, None, None, sentence_size)):
                 recreated_sentence, subtree_node_positions = self.recreate_sentence(sentence, r)
                 sentence_conll = (r.node.node.get_root().conll, subtree_node_positions) if self.filters['annodoc'] else None
-                self.summary.representation_trees[key]['sentence'] = [(sentence['id'],
-                                                                       recreated_sentence,
-                                                                       sentence_conll,
-                                                                       sentence_size)]
-            self.summary.representation_trees[key]['number'] += 1
+                table.set_value(row, 'sentence', [(sentence['id'],
+                                                   recreated_sentence,
+                                                   sentence_conll,
+                                                   sentence_size)])
         else:
-            self.summary.representation_trees[key] = {'number': 1, 'key': key_raw, 'word_array': word_array}
+            row = table.add(key, r.get_array(self.filters), r.node.name if self.filters['head_info'] else None)
 
             if self.configs['grew_match']:
-                self.summary.representation_trees[key]['grew'] = r.get_grew()
-                self.summary.representation_trees[key]['location'] = r.get_location_mapper(self.filters)
+                table.set_value(row, 'grew', r.get_grew())
+                table.set_value(row, 'location', r.get_location_mapper(self.filters))
 
                 # recreate example sentence with shown positions of subtree
             if self.filters['example'] or self.filters['detailed_results_file']:
                 recreated_sentence, subtree_node_positions = self.recreate_sentence(sentence, r)
                 sentence_conll = (r.node.node.get_root().conll, subtree_node_positions) if self.filters['annodoc'] else None
-                sentence_size = len(sentence['tokens']) if 'tokens' in sentence else 10000
-                self.summary.representation_trees[key]['sentence'] = [(sentence['id'],
-                                                                       recreated_sentence,
-                                                                       sentence_conll,
-                                                                       sentence_size)]
-            if self.filters['node_order']:
-                self.summary.representation_trees[key]['order_letters'] = order_letters
-                if self.configs['depsearch']:
-                    self.summary.representation_trees[key]['key_sorted'] = r.get_key_sorted(self.filters)[1:-1]
-            if self.filters['head_info']:
-                self.summary.representation_trees[key]['root_name'] = r.node.name
+                table.set_value(row, 'sentence', [(sentence['id'],
+                                                   recreated_sentence,
+                                                   sentence_conll,
+                                                   sentence_size)])
+            # order letters are part of key
+            if self.filters['node_order'] and self.configs['depsearch']:
+                table.set_value(row, 'key_sorted', r.get_key_sorted(self.filters)[1:-1])
             if self.configs['greedy_counter'] and self.summary.max_tree_size < r.tree_size:
                 self.summary.max_tree_size = r.tree_size
 
@@ -201,14 +434,81 @@ class QueryCounter(Counter):
     def __init__(self, *configs):
         super().__init__(*configs)
 
+    def create_prefilter(self):
+        return QueryPrefilter.from_query_trees(self.summary.query_trees, self.filters)
+
+    def get_heads(self, document):
+        """
+        When document has an index (see `CorpusIndex`), only sentences that it finds are searched and only from
+        topmost nodes that may be heads of query trees. Otherwise sentences are prefiltered with their masks.
+        :param document:
+        :return:
+        """
+        if document.index is None:
+            return super().get_heads(document)
+        candidate_heads = document.index.find_heads(self.summary.query_trees, self.filters)
+        sentences_heads = []
+        for sentence_index, tree in enumerate(document.trees):
+            if sentence_index not in candidate_heads:
+                sentences_heads.append([])
+                self.skipped_sentences_number += 1 if tree else 0
+            elif candidate_heads[sentence_index] is None:
+                sentences_heads.append(tree)
+            else:
+                sentences_heads.append(self.get_topmost_nodes(tree, candidate_heads[sentence_index]))
+        return sentences_heads
+
+    @staticmethod
+    def get_topmost_nodes(tree, indices):
+        """
+        Returns nodes of a sentence with given indices that are not below another one of them. Nodes are in the order
+        in which they are reached from roots, so subtrees are found in the same order as when searching from roots.
+        :param tree: List of roots of a sentence.
+        :param indices: Set of indices of nodes.
+        :return:
+        """
+        nodes = []
+        stack = list(reversed(tree))
+        while stack:
+            node = stack.pop()
+            if node.index in indices:
+                nodes.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return nodes
+
+    def postprocess_subtrees(self, subtrees, sentence):
+        """
+        When queries are counted separately, keys of their subtrees are prefixed with codes of queries.
+        :param subtrees:
+        :param sentence:
+        :return:
+        """
+        if not self.filters['separate_queries']:
+            return super().postprocess_subtrees(subtrees, sentence)
+        for query_index, query_subtrees in enumerate(subtrees):
+            if query_subtrees:
+                query_code = self.summary.get_query_code(self.summary.vocabulary, query_index)
+                for subtree in query_subtrees:
+                    self.postprocess_query_results(subtree, sentence, query_code)
+
     @staticmethod
     def tree_calculations(input_data):
+        """
+        Searches subtrees of all query trees in a single traversal of a sentence.
+        :param input_data: A tuple containing tree, query trees and filters.
+        :return: List of subtrees, or list of subtrees of every query tree when queries are counted separately.
+        """
         tree, query_trees, filters = input_data
         subtrees = []
         # there might be multiple roots in a sentence/tree
         for tree_root in tree:
             _, subtrees_part = tree_root.get_subtrees(query_trees, [], filters)
             subtrees += subtrees_part
+        if filters['separate_queries']:
+            # results of a query tree for every root
+            return [[subtree for query_results in subtrees[query_index::len(query_trees)] for subtree in query_results]
+                    for query_index in range(len(query_trees))]
         return [subtree for query_results in subtrees for subtree in query_results]
 
 
@@ -235,10 +535,88 @@ class GreedyCounter(Counter):
     @staticmethod
     def filter_subtrees(query_trees, subtrees, filters):
         """
-        Filters subtrees and ignores labels if necessary.
+        Filters subtrees by queries and ignores labels if necessary. Other filters (see
+        `GreedyRepresentationTree.pass_filter`) are already applied while subtrees are enumerated.
         :param query_trees:
         :param subtrees:
         :param filters:
         :return:
         """
-        return [subtree.ignore_labels(filters) for subtree in subtrees if subtree.pass_filter(query_trees, filters)]
+        return [subtree.ignore_labels(filters) for subtree in subtrees if subtree.pass_query(query_trees, filters)]
+
+
+class GreedyKeyCounter(GreedyCounter):
+    """
+    Greedy counter that only counts keys of subtrees, without creating representation trees. It is used when no output
+    requires single subtree instances (examples, detailed results, grew-match, depsearch, sentence counts).
+    """
+
+    @staticmethod
+    def is_applicable(query_trees, filters, configs):
+        """
+        Checks whether counting keys only is enough for requested output.
+        :param query_trees:
+        :param filters:
+        :param configs:
+        :return:
+        """
+        return (configs['greedy_counter'] and query_trees is None and not filters['example']
+                and not filters['detailed_results_file'] and not filters['sentence_count_file']
+                and not filters['annodoc'] and not configs['grew_match'] and not configs['depsearch'])
+
+    def run_multiprocessor(self):
+        """
+        Subtree instances are not sent between processes (they are coded with vocabulary of summary), whole chunks of
+        sentences are counted in worker processes instead.
+        :return:
+        """
+        self.run_multiprocessor_aggregation()
+
+    def count_sentence(self, tree, sentence, heads=None):
+        unigrams = self.get_unigrams((tree, self.filters)) if self.filters['association_measures'] else []
+        self.add_unigrams(unigrams)
+        for subtree in self.instance_calculations(tree, self.summary.vocabulary, self.filters):
+            self.postprocess_query_results(subtree, sentence)
+
+    @staticmethod
+    def instance_calculations(tree, vocabulary, filters):
+        """
+        Returns subtree instances of a sentence that pass filters (they are applied while instances are enumerated).
+        :param tree: List of roots of a sentence.
+        :param vocabulary: Vocabulary with which keys of instances are coded.
+        :param filters:
+        :return:
+        """
+        subtrees = []
+        # there might be multiple roots in a sentence/tree
+        for tree_root in tree:
+            _, subtrees_part = tree_root.get_subtree_instances(filters, vocabulary)
+            subtrees += subtrees_part
+
+        return subtrees
+
+    def postprocess_query_results(self, r, sentence):
+        """
+        Counts subtree instance into Summary object. Array of tree elements is created only for new keys.
+        :param r: Subtree instance.
+        :param sentence:
+        :return:
+        """
+        size = r[INSTANCE_SIZE]
+        if self.filters['ignored_labels'] and self.filters['display_size_range'][0] and \
+                (size > self.filters['display_size_range'][-1] or size < self.filters['display_size_range'][0]):
+            return
+        if self.filters['node_order']:
+            order_letters = RepresentationTree.get_order_letters(list(r[INSTANCE_ORDER]))
+            key = r[INSTANCE_KEY] + ORDER + order_letters
+        else:
+            key = r[INSTANCE_KEY]
+
+        table = self.summary.representation_trees
+        if table.increment(key) is not None:
+            return
+
+        table.add(key, GreedyTree.get_instance_array(r, self.filters),
+                  r[INSTANCE_NODE][NODE_NAME] if self.filters['head_info'] else None)
+        if self.summary.max_tree_size < size:
+            self.summary.max_tree_size = size
@@ -14,24 +14,32 @@
 import gc
 import logging
 import os
+import re
 
 import pyconll
+from pyconll.unit.sentence import Sentence
 
 from stark.data.document import Document
 from stark.data.processing.greedy_tree import GreedyTree
 from stark.data.processing.query_tree import QueryTree
 from stark.processing.cache import DocumentCache
+from stark.processing.filters import QueryPrefilter
+from stark.processing.index import CorpusIndex
 
 logger = logging.getLogger('stark')
 
+SENTENCE_ID_PATTERN = re.compile(r'#\s*sent_id\s*=\s*(.+)')
+
 
 class DocumentProcessor(object):
     """
     A class that processes document.
     """
-    def __init__(self, path, processor):
+    def __init__(self, path, processor, byte_range=None):
         self.path = path
         self.processor = processor
+        # when given, only sentences in (start, end) bytes of a file are processed
+        self.byte_range = byte_range
         self.cache = DocumentCache(self, path)
 
     def form_trees(self, summary, configs):
@@ -42,6 +50,18 @@ class DocumentProcessor(object):
         """
         return self.cache.create_trees(summary, configs)
 
+    def create_index(self, summary, configs):
+        """
+        Creates inverted index of document (see `CorpusIndex`) and stores it into internal_saves, together with trees
+        of document.
+        :param summary:
+        :param configs:
+        :return: Number of indexed sentences.
+        """
+        document = self.form_trees(summary, configs)
+        self.cache.save_index(CorpusIndex.from_document(document, self.path, configs))
+        return len(document.trees)
+
     @staticmethod
     def _reform_misc(misc):
         """
@@ -64,9 +84,72 @@ class DocumentProcessor(object):
         document = Document()
 
         logger.info("Reading file: " + self.path)
-        train = pyconll.load_from_file(self.path)
-        for sentence in train:
-            token_nodes = []
+        for sentence_id, tokens, sentence_conll in self._read_sentences(configs):
+            self._create_sentence_trees(sentence_id, tokens, sentence_conll, document, summary, configs)
+
+        gc.collect()
+
+        return document
+
+    def iterate_trees(self, summary, configs):
+        """
+        Reads file sentence by sentence and yields Document objects, each containing at most `batch_size` trees. Only
+        one batch is held in memory at a time, so counting can start before the whole file is parsed.
+        :param summary:
+        :param configs:
+        :return:
+        """
+        document = Document()
+
+        logger.info("Streaming file: " + self.path)
+        for sentence_id, tokens, sentence_conll in self._read_sentences(configs):
+            self._create_sentence_trees(sentence_id, tokens, sentence_conll, document, summary, configs)
+            if len(document.trees) >= configs['batch_size']:
+                yield document
+                document = Document()
+
+        if document.trees:
+            yield document
+
+    def _read_sentences(self, configs):
+        """
+        Returns a generator over sentences of a file, using reader selected in configs.
+        :param configs:
+        :return:
+        """
+        if configs['conllu_reader'] == 'native':
+            return self._read_native_sentences()
+        return self._read_pyconll_sentences()
+
+    def _read_lines(self):
+        """
+        Yields lines of a file or only lines inside byte range, when it is given.
+        :return:
+        """
+        if self.byte_range is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                yield from f
+            return
+
+        start, end = self.byte_range
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while position < end:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                yield line.decode('utf-8')
+
+    def _read_pyconll_sentences(self):
+        """
+        Reads sentences with pyconll. Yields sentence id, a list of token tuples (index, form, lemma, upos, xpos,
+        deprel, head, feats, misc, space_after) and a function that returns sentence in conllu format.
+        :return:
+        """
+        for lines in self._read_sentence_lines():
+            sentence = Sentence('\n'.join(lines))
             tokens = []
             for token in sentence:
                 if not token.id.isdigit():
@@ -77,50 +160,145 @@ class DocumentProcessor(object):
                 token_upos = token.upos if token.upos is not None else '_'
                 token_xpos = token.xpos if token.xpos is not None else '_'
                 token_misc = self._reform_misc(token.misc) if token.misc else '_'
-                token_deprel = token.deprel if self.processor.configs['label_subtypes'] \
-                    else token.deprel.split(':')[0]
-                if self.processor.configs['greedy_counter']:
-                    node = GreedyTree(int(token.id), token_form, token_lemma, token_upos, token_xpos, token_deprel,
-                                      token.head, token.feats, token_misc, document, summary)
-                else:
-                    node = QueryTree(int(token.id), token_form, token_lemma, token_upos, token_xpos, token_deprel,
-                                     token.head, token.feats, token_misc, document, summary)
-                token_nodes.append(node)
                 space_after = token.misc[
                                   'SpaceAfter'].pop() != 'No' if token.misc is not None and 'SpaceAfter' in token.misc \
                     else True
-                tokens.append((token_form, space_after))
-
-                summary.corpus_size += 1
-            document.sentence_statistics.append({'id': sentence.id, 'tokens': tokens, 'count': {}})
-            roots = []
-            for token_id, token in enumerate(token_nodes):
-                if isinstance(token.parent, int) or token.parent == '':
-                    logger.warning('No parent: ' + sentence.id)
-                    break
-                if int(token.parent) == 0:
-                    token.set_parent(None)
-                    # add a conllu string if necessary
-                    if configs['annodoc_example_dir'] is not None:
-                        token.add_conll_sentence(sentence.conll())
-                    roots.append(token)
-                else:
-                    parent_id = int(token.parent) - 1
-                    if token_nodes[parent_id].children_split == -1 and token_id > parent_id:
-                        token_nodes[parent_id].children_split = len(token_nodes[parent_id].children)
-                    token_nodes[parent_id].add_child(token)
-                    token.set_parent(token_nodes[parent_id])
-
-            for token in token_nodes:
-                if token.children_split == -1:
-                    token.children_split = len(token.children)
-
-            if not roots:
-                logger.warning('No root: ' + sentence.id)
-
-            document.trees.append(roots)
-
-        del train
-        gc.collect()
+                tokens.append((int(token.id), token_form, token_lemma, token_upos, token_xpos, token.deprel,
+                               token.head, token.feats, token_misc, space_after))
+            yield sentence.id, tokens, sentence.conll
 
-        return document
+    def _read_native_sentences(self):
+        """
+        Reads sentences by splitting lines of a file into columns, without creating pyconll objects. MISC column is
+        kept as it is written in the file. Yields the same data as `_read_pyconll_sentences`.
+        :return:
+        """
+        for lines in self._read_sentence_lines():
+            yield self._create_native_sentence(lines)
+
+    def _read_sentence_lines(self):
+        """
+        Yields stripped, non-empty lines of every sentence (sentences are separated by empty lines).
+        :return:
+        """
+        lines = []
+        for line in self._read_lines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+            elif lines:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+    @staticmethod
+    def _create_native_sentence(lines):
+        """
+        Splits lines of a single sentence into token tuples.
+        :param lines: Stripped, non-empty lines of a sentence.
+        :return:
+        """
+        sentence_id = None
+        tokens = []
+        for line in lines:
+            if line[0] == '#':
+                match = SENTENCE_ID_PATTERN.match(line)
+                if match:
+                    sentence_id = match.group(1)
+                continue
+            columns = line.split('\t')
+            if len(columns) != 10:
+                raise ValueError('The number of columns per token line must be 10. Invalid token: ' + line)
+            if not columns[0].isdigit():
+                continue
+            index, form, lemma, upos, xpos, feats, head, deprel, _, misc = columns
+            token_feats = {}
+            if feats != '_':
+                for feat in feats.split('|'):
+                    name, _, values = feat.partition('=')
+                    if not name or not values:
+                        raise ValueError('Invalid feats in token: ' + line)
+                    token_feats[name] = set(values.split(','))
+            tokens.append((int(index), form, lemma, upos, xpos, deprel if deprel != '_' else None,
+                           head if head != '_' else None, token_feats, misc, 'SpaceAfter=No' not in misc.split('|')))
+        return sentence_id, tokens, lambda: '\n'.join(lines)
+
+    def _create_sentence_trees(self, sentence_id, tokens, sentence_conll, document, summary, configs):
+        """
+        Creates trees of a single sentence and appends them (together with sentence statistics) to document.
+        :param sentence_id:
+        :param tokens: A list of token tuples.
+        :param sentence_conll: A function that returns sentence in conllu format.
+        :param document:
+        :param summary:
+        :param configs:
+        :return:
+        """
+        token_nodes = []
+        sentence_tokens = []
+        for index, form, lemma, upos, xpos, deprel, head, feats, misc, space_after in tokens:
+            token_deprel = deprel if configs['label_subtypes'] else deprel.split(':')[0]
+            if configs['greedy_counter']:
+                node = GreedyTree(index, form, lemma, upos, xpos, token_deprel, head, feats, misc, document, summary)
+            else:
+                node = QueryTree(index, form, lemma, upos, xpos, token_deprel, head, feats, misc, document, summary)
+            token_nodes.append(node)
+            sentence_tokens.append((form, space_after))
+
+            summary.corpus_size += 1
+        document.sentence_statistics.append({'id': sentence_id, 'tokens': sentence_tokens, 'count': {}})
+        # masks are only used by query counter to skip sentences
+        document.sentence_masks.append(QueryPrefilter.get_sentence_mask(token_nodes)
+                                       if not configs['greedy_counter'] else None)
+        roots = []
+        for token_id, token in enumerate(token_nodes):
+            if isinstance(token.parent, int) or token.parent == '':
+                logger.warning('No parent: ' + sentence_id)
+                break
+            if int(token.parent) == 0:
+                token.set_parent(None)
+                # add a conllu string if necessary
+                if configs['annodoc_example_dir'] is not None:
+                    token.add_conll_sentence(sentence_conll())
+                roots.append(token)
+            else:
+                parent_id = int(token.parent) - 1
+                if token_nodes[parent_id].children_split == -1 and token_id > parent_id:
+                    token_nodes[parent_id].children_split = len(token_nodes[parent_id].children)
+                token_nodes[parent_id].add_child(token)
+                token.set_parent(token_nodes[parent_id])
+
+        for token in token_nodes:
+            if token.children_split == -1:
+                token.children_split = len(token.children)
+
+        if not roots:
+            logger.warning('No root: ' + sentence_id)
+
+        document.trees.append(roots)
+
+
+def split_into_shards(path, shards_number):
+    """
+    Splits file into (approximately) equally large byte ranges, which always end at a sentence boundary.
+    :param path: Path to conllu file.
+    :param shards_number: Maximal number of shards.
+    :return: List of (start, end) byte positions.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards_number):
+            position = max(size * i // shards_number, boundaries[-1])
+            f.seek(position)
+            # skip the (possibly partial) line and then move to the first empty line
+            f.readline()
+            line = f.readline()
+            while line and line.strip():
+                line = f.readline()
+            position = f.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
@@ -12,11 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import zlib
+from itertools import chain
+from operator import attrgetter
+
+from stark.data.vocabulary import attribute_vocabulary
 from stark.utils import create_output_string_deprel, create_output_string_lemma, create_output_string_upos, \
     create_output_string_xpos, create_output_string_feats, create_output_string_form, create_output_string_none, \
     create_output_string_misc
 
 ROOT_WHITELIST_OPTIONS = ['deprel', 'feats', 'form', 'lemma', 'upos', 'misc']
+# root whitelist options whose values are compared as ids of attribute vocabulary
+ATTRIBUTE_OPTIONS = ['deprel', 'form', 'lemma', 'upos', 'misc']
+# query restrictions whose values are compared as ids of attribute vocabulary
+QUERY_ATTRIBUTE_OPTIONS = ['form', 'lemma', 'upos', 'xpos', 'deprel']
+# attributes whose values are stored in sentence masks (features are stored as strings such as 'Case=Nom')
+MASK_ATTRIBUTES = ['form_id', 'lemma_id', 'upos_id', 'xpos_id', 'deprel_id', 'feats']
+# number of bits in a sentence mask
+MASK_BITS = 2048
 
 
 def read_filters(configs):
@@ -81,7 +94,9 @@ def read_filters(configs):
         'nodes_number': configs['nodes_number'],
         'frequency_threshold': configs['frequency_threshold'],
         'lines_threshold': configs['lines_threshold'],
-        'head_info': configs['head_info']
+        'head_info': configs['head_info'],
+        # results of queries from query_file are counted separately
+        'separate_queries': 'queries' in configs
     }
 
     if configs['root_whitelist']:
@@ -99,16 +114,279 @@ def read_filters(configs):
                 else:
                     negation = False
                 if len(value) == 1:
-                    attribute_dict['form'] = (negation, value[0])
+                    attribute_dict['form'] = (negation, attribute_vocabulary.get_id(value[0]))
+                elif value[0] in ATTRIBUTE_OPTIONS:
+                    attribute_dict[value[0]] = (negation, attribute_vocabulary.get_id(value[1]))
                 else:
                     attribute_dict[value[0]] = (negation, value[1])
             filters['root_whitelist'].append(attribute_dict)
+        filters['root_whitelist_predicate'] = AttributePredicate.from_root_whitelist(filters['root_whitelist'])
     else:
         filters['root_whitelist'] = []
+        filters['root_whitelist_predicate'] = None
 
     return filters
 
 
+class AttributePredicate(object):
+    """
+    Restriction options (of a query node or root whitelist) compiled into a single function of a node, which compares
+    attribute ids of node with ids of options directly. Node fits predicate when it fits any of its options.
+
+    Options are lists of conditions (attribute, feature, negation, value), where attribute is either an id attribute
+    of node (e.g. 'form_id') or 'feats' (with name of feature). Predicates are pickled as their options and composed
+    again when they are unpickled.
+    """
+    def __init__(self, options):
+        self.options = options
+        self.check = AttributePredicate._compile(options)
+
+    def __reduce__(self):
+        return AttributePredicate, (self.options,)
+
+    def __eq__(self, other):
+        return isinstance(other, AttributePredicate) and self.options == other.options
+
+    @staticmethod
+    def _compile(options):
+        """
+        Returns function of a node that checks options, composed of functions of single options. Options that differ
+        only in values of attributes that have to be equal are checked together, by looking up values of node in a set.
+        :param options:
+        :return:
+        """
+        values_by_conditions = {}
+        for option in options:
+            equal_attributes = tuple(attribute for attribute, _, negation, _ in option
+                                     if attribute != 'feats' and not negation)
+            equal_values = tuple(value for attribute, _, negation, value in option
+                                 if attribute != 'feats' and not negation)
+            unequal_attributes = tuple((attribute, value) for attribute, _, negation, value in option
+                                       if attribute != 'feats' and negation)
+            equal_feats = frozenset((feature, value) for attribute, feature, negation, value in option
+                                    if attribute == 'feats' and not negation)
+            unequal_feats = frozenset((feature, value) for attribute, feature, negation, value in option
+                                      if attribute == 'feats' and negation)
+            conditions = (equal_attributes, unequal_attributes, equal_feats, unequal_feats)
+            values_by_conditions.setdefault(conditions, set()).add(
+                equal_values if len(equal_values) > 1 else next(iter(equal_values), None))
+        checks = [AttributePredicate._compile_option(*conditions, values)
+                  for conditions, values in values_by_conditions.items()]
+
+        if not checks:
+            return lambda node: False
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_any(node):
+            for check in checks:
+                if check(node):
+                    return True
+            return False
+        return check_any
+
+    @staticmethod
+    def _compile_option(equal_attributes, unequal_attributes, equal_feats, unequal_feats, values):
+        """
+        Returns function of a node that checks whether it fits all conditions of an option.
+        :param equal_attributes: Names of attributes that have to be equal to one of values.
+        :param unequal_attributes: (attribute, value) pairs of attributes that have to differ from values.
+        :param equal_feats: (feature, value) pairs that feats of node (a dictionary) have to contain.
+        :param unequal_feats: (feature, value) pairs that feats of node must not contain.
+        :param values: Set of values of equal attributes (tuples of values, when there are multiple attributes).
+        :return:
+        """
+        get_values = attrgetter(*equal_attributes) if equal_attributes else None
+        if get_values is not None and not (unequal_attributes or equal_feats or unequal_feats):
+            if len(values) == 1:
+                value = next(iter(values))
+                return lambda node: get_values(node) == value
+            return lambda node: get_values(node) in values
+        unequal_attributes = tuple((attrgetter(attribute), value) for attribute, value in unequal_attributes)
+
+        def check_all(node):
+            if get_values is not None and get_values(node) not in values:
+                return False
+            if unequal_attributes:
+                for get_attribute, value in unequal_attributes:
+                    if get_attribute(node) == value:
+                        return False
+            if equal_feats and not node.feats.items() >= equal_feats:
+                return False
+            return not unequal_feats or unequal_feats.isdisjoint(node.feats.items())
+        return check_all
+
+    @classmethod
+    def from_query_restrictions(cls, restrictions):
+        """
+        Compiles restrictions of a query node (see `decode_query`).
+        :param restrictions:
+        :return:
+        """
+        options = []
+        for restriction in restrictions:
+            option = []
+            for attribute in QUERY_ATTRIBUTE_OPTIONS:
+                if attribute in restriction:
+                    option.append((attribute + '_id', None) + restriction[attribute])
+            if 'feats_detailed' in restriction:
+                for feature, (negation, value) in restriction['feats_detailed'].items():
+                    option.append(('feats', feature, negation, value))
+            options.append(option)
+        return cls(options)
+
+    @classmethod
+    def from_root_whitelist(cls, root_whitelist):
+        """
+        Compiles options of root whitelist (see `read_filters`). Options that are not attributes are features.
+        :param root_whitelist:
+        :return:
+        """
+        options = []
+        for attribute_dict in root_whitelist:
+            option = []
+            for attribute in ATTRIBUTE_OPTIONS:
+                if attribute in attribute_dict:
+                    option.append((attribute + '_id', None) + attribute_dict[attribute])
+            for feature, (negation, value) in attribute_dict.items():
+                if feature not in ROOT_WHITELIST_OPTIONS:
+                    option.append(('feats', feature, negation, value))
+            options.append(option)
+        return cls(options)
+
+
+class QueryPrefilter(object):
+    """
+    Necessary conditions of query trees, used to skip sentences that cannot contain any of them before their subtrees
+    are searched. A sentence must have at least as many tokens as a query tree has nodes. For each node of the query
+    tree (and for its root, when there is a root whitelist), at least one option must have all of its required values
+    in the sentence. Required values are values of positive conditions, e.g. `L=be` or `>nsubj`.
+
+    Values in a sentence are stored in its mask. The mask is a Bloom filter built while the sentence is parsed (see
+    `get_sentence_mask`), so a sentence is sometimes kept when it could have been skipped, but it is never skipped
+    wrongly. Bits of values are calculated from strings, so masks in document caches remain valid in other runs.
+    """
+    def __init__(self, requirements):
+        # alternatives (one per query tree), each a tuple of the minimal number of tokens and requirements of nodes
+        # (tuples of masks of options, a sentence fits an option when all bits of its mask are set)
+        self.requirements = requirements
+
+    @staticmethod
+    def get_value_mask(attribute_index, value):
+        """
+        Returns mask with the two bits of a value of an attribute.
+        :param attribute_index: Index of attribute in MASK_ATTRIBUTES.
+        :param value: String form of value.
+        :return:
+        """
+        code = zlib.crc32(value.encode('utf-8'), attribute_index)
+        return (1 << (code % MASK_BITS)) | (1 << ((code >> 16) % MASK_BITS))
+
+    @staticmethod
+    def get_sentence_mask(nodes):
+        """
+        Returns mask of all values (of attributes in MASK_ATTRIBUTES) of nodes of a sentence. Each distinct value is
+        added only once.
+        :param nodes:
+        :return:
+        """
+        values = attribute_vocabulary.values
+        sentence_values = [set(map(values.__getitem__, map(attrgetter(attribute), nodes)))
+                           for attribute in MASK_ATTRIBUTES[:-1]]
+        sentence_values.append(set(chain.from_iterable(node.feats.parts for node in nodes)))
+        mask = 0
+        for attribute_index, attribute_values in enumerate(sentence_values):
+            for value in attribute_values:
+                mask |= QueryPrefilter.get_value_mask(attribute_index, value)
+        return mask
+
+    @staticmethod
+    def get_option_values(option):
+        """
+        Returns values that an option of a predicate (see `AttributePredicate`) requires, as pairs of index of attribute
+        in MASK_ATTRIBUTES and string form of value. These are values of its positive conditions on attributes of
+        masks.
+        :param option:
+        :return:
+        """
+        option_values = []
+        for attribute, feature, negation, value in option:
+            if negation or attribute not in MASK_ATTRIBUTES:
+                continue
+            if attribute == 'feats':
+                option_values.append((MASK_ATTRIBUTES.index(attribute), f'{feature}={value}'))
+            else:
+                option_values.append((MASK_ATTRIBUTES.index(attribute), attribute_vocabulary.values[value]))
+        return option_values
+
+    @classmethod
+    def get_option_mask(cls, option):
+        """
+        Returns mask of required values of an option of a predicate, or None when it has no required values.
+        :param option:
+        :return:
+        """
+        mask = 0
+        for attribute_index, value in cls.get_option_values(option):
+            mask |= cls.get_value_mask(attribute_index, value)
+        return mask if mask else None
+
+    @classmethod
+    def get_predicate_requirement(cls, predicate):
+        """
+        Returns masks of options of a predicate, or None when any of its options has no required values.
+        :param predicate:
+        :return:
+        """
+        masks = [cls.get_option_mask(option) for option in predicate.options]
+        if not masks or None in masks:
+            return None
+        return tuple(sorted(set(masks)))
+
+    @classmethod
+    def from_query_trees(cls, query_trees, filters):
+        """
+        Collects conditions of query trees (compiled by `compile_query_tree`) and of root whitelist.
+        :param query_trees:
+        :param filters:
+        :return:
+        """
+        requirements = set()
+        for query_tree in query_trees:
+            size = 0
+            node_requirements = set()
+            predicates = [filters['root_whitelist_predicate']]
+            query_nodes = [query_tree]
+            while query_nodes:
+                query_node = query_nodes.pop()
+                size += 1
+                if 'predicate' in query_node:
+                    predicates.append(query_node['predicate'])
+                if 'children' in query_node:
+                    query_nodes.extend(query_node['children'])
+            for predicate in predicates:
+                if predicate is not None:
+                    requirement = cls.get_predicate_requirement(predicate)
+                    if requirement is not None:
+                        node_requirements.add(requirement)
+            requirements.add((size, tuple(sorted(node_requirements))))
+        return cls(sorted(requirements))
+
+    def check(self, mask, size):
+        """
+        Checks whether a sentence may contain any of query trees.
+        :param mask: Mask of sentence (None when it was not created, then only size is checked).
+        :param size: Number of tokens in sentence.
+        :return:
+        """
+        for min_size, node_requirements in self.requirements:
+            if size >= min_size and (mask is None or all(any(mask & option_mask == option_mask
+                                                             for option_mask in node_requirement)
+                                                         for node_requirement in node_requirements)):
+                return True
+        return False
+
+
 class Filter(object):
     @staticmethod
     def check_representation_tree(tree, filters):
@@ -118,121 +396,55 @@ class Filter(object):
         :param tree:
         :return:
         """
-        return (
-                Filter.check_tree_size(tree.tree_size, filters)
-                and Filter.check_root_whitelist(tree.node.node.form, tree.node.node.lemma, tree.node.node.upos,
-                                                tree.node.node.feats, tree.node.node.deprel, tree.node.node.misc, filters)
-        )
+        return Filter.check_tree_size(tree.tree_size, filters) and Filter.check_root_whitelist(tree.node.node, filters)
 
     @staticmethod
-    def check_query_tree(query_tree, form, lemma, upos, xpos, feats, deprel, children, filters):
+    def check_query_tree(query_tree, node, children, filters):
         """
-        Checks if attributes of a tree fit attributes of query_tree.
+        Checks if attributes of a node fit restrictions of query_tree (compiled by `compile_query_tree`).
         :param query_tree:
-        :param form:
-        :param lemma:
-        :param upos:
-        :param xpos:
-        :param feats:
-        :param deprel:
+        :param node:
         :param children:
         :param filters:
         :return:
         """
-        filter_passed = (not filters['complete_tree_type'] or (len(children) == 0 and 'children' not in query_tree) or
-                         ('children' in query_tree and len(children) == len(query_tree['children'])))
-
         # restrictions might not be in query tree when dealing with query counter and size
-        if 'restrictions' not in query_tree or not query_tree['restrictions']:
-            return filter_passed
-
-        # ('deprel' not in option or (option['deprel'][1] == deprel) == (not option['deprel'][0])) and \
-        for option in query_tree['restrictions']:
-            filter_passed = ('form' not in option or (option['form'][1] == form) == (not option['form'][0])) and \
-                ('lemma' not in option or (option['lemma'][1] == lemma) == (not option['lemma'][0])) and \
-                ('upos' not in option or (option['upos'][1] == upos) == (not option['upos'][0])) and \
-                ('xpos' not in option or (option['xpos'][1] == xpos) == (not option['xpos'][0])) and \
-                ('deprel' not in option or (option['deprel'][1] == deprel) == (not option['deprel'][0])) and \
-                Filter._check_query_tree_feats(option, feats)
-
-            if filter_passed:
-                return True
+        if 'predicate' not in query_tree:
+            return (not filters['complete_tree_type'] or (len(children) == 0 and 'children' not in query_tree) or
+                    ('children' in query_tree and len(children) == len(query_tree['children'])))
 
-        return False
+        return query_tree['predicate'].check(node)
 
     @staticmethod
-    def _check_query_tree_feats(option, feats):
+    def check_tree_size(size, filters):
         """
-        Checks if feats of a tree fit feats of option.
-        :param option:
-        :param feats:
+        Checks if tree size is in filtered range.
+        :param size:
+        :param filters:
         :return:
         """
-        if 'feats_detailed' not in option:
-            return True
-
-        for feat in option['feats_detailed'].keys():
-            if feat not in feats:
-                if not option['feats_detailed'][feat][0]:
-                    return False
-            elif option['feats_detailed'][feat][1] != feats[feat] and not option['feats_detailed'][feat][0]:
-                return False
-            elif option['feats_detailed'][feat][1] == feats[feat] and option['feats_detailed'][feat][0]:
-                return False
-        return True
+        return filters['tree_size_range'][0] <= size <= filters['tree_size_range'][-1]
 
     @staticmethod
-    def check_tree_size(size, filters):
+    def check_display_size(size, filters):
         """
-        Checks if tree size is in filtered range.
+        Checks if tree size is in displayed range (when it is limited).
         :param size:
         :param filters:
         :return:
         """
-        return filters['tree_size_range'][0] <= size <= filters['tree_size_range'][-1]
+        return not filters['display_size_range'][-1] or \
+            filters['display_size_range'][0] <= size <= filters['display_size_range'][-1]
 
     @staticmethod
-    def check_root_whitelist(form, lemma, upos, feats, deprel, misc, filters):
+    def check_root_whitelist(node, filters):
         """
-        When root whitelist exists checks if element parameters are acceptable.
-        :param form:
-        :param lemma:
-        :param upos:
-        :param feats:
-        :param deprel:
+        When root whitelist exists checks if node fits it.
+        :param node:
         :param filters:
         :return:
         """
-        if not filters['root_whitelist']:
-            return True
-
-        for option in filters['root_whitelist']:
-            filter_passed = True
-            # check if attributes are valid
-            for key in option.keys():
-                if key not in ROOT_WHITELIST_OPTIONS:
-                    # key not in feats and not negated
-                    if key not in feats:
-                        if not option[key][0]:
-                            filter_passed = False
-                    # key different, then in head and not negated
-                    elif option[key][1] != feats[key] and not option[key][0]:
-                        filter_passed = False
-                    # key equal, and negated
-                    elif option[key][1] == feats[key] and option[key][0]:
-                        filter_passed = False
-
-            filter_passed = filter_passed and \
-                ('deprel' not in option or (option['deprel'][1] == deprel) == (not option['deprel'][0])) and \
-                ('form' not in option or (option['form'][1] == form) == (not option['form'][0])) and \
-                ('lemma' not in option or (option['lemma'][1] == lemma) == (not option['lemma'][0])) and \
-                ('upos' not in option or (option['upos'][1] == upos) == (not option['upos'][0])) and \
-                ('misc' not in option or (option['misc'][1] == misc) == (not option['misc'][0]))
-
-            if filter_passed:
-                return True
-
-        return False
+        return filters['root_whitelist_predicate'] is None or filters['root_whitelist_predicate'].check(node)
 
     @staticmethod
     def check_label_whitelist(deprel, filters):
@@ -0,0 +1,170 @@
+# Copyright 2024 CJVT
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from array import array
+
+from stark.data.vocabulary import attribute_vocabulary
+from stark.processing.filters import MASK_ATTRIBUTES, QueryPrefilter
+
+# positions of tokens are coded as index of sentence in document, shifted by TOKEN_BITS, and index of token in sentence
+TOKEN_BITS = 20
+TOKEN_MASK = (1 << TOKEN_BITS) - 1
+
+
+class CorpusIndex(object):
+    """
+    Inverted index of a document, that maps values of attributes (form, lemma, upos, xpos, deprel and features) to
+    positions of tokens that have them. It is created by `stark index` and stored in internal_saves. Query counter uses
+    it to visit only sentences that may contain query trees and to search them only from nodes that may be heads of
+    query trees (see `find_heads`).
+
+    Values are stored as strings (pairs of index of attribute in MASK_ATTRIBUTES and value, as in `QueryPrefilter`),
+    so index is valid in all runs. Index is not used when indexed file has changed.
+    """
+    def __init__(self, source, label_subtypes):
+        # size and time of modification of indexed file
+        self.source = source
+        self.label_subtypes = label_subtypes
+        self.sentence_sizes = array('I')
+        # arrays of positions of tokens by values
+        self.postings = {}
+
+    @staticmethod
+    def get_source(path):
+        """
+        Returns size and time of modification of a file.
+        :param path:
+        :return:
+        """
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def from_document(cls, document, path, configs):
+        """
+        Creates index of all sentences of a document.
+        :param document:
+        :param path: Path to file of document.
+        :param configs:
+        :return:
+        """
+        index = cls(cls.get_source(path), configs['label_subtypes'])
+        values = attribute_vocabulary.values
+        feats_index = len(MASK_ATTRIBUTES) - 1
+        postings = index.postings
+        for sentence_index, (tree, sentence) in enumerate(zip(document.trees, document.sentence_statistics)):
+            index.sentence_sizes.append(len(sentence['tokens']))
+            nodes = list(tree)
+            while nodes:
+                node = nodes.pop()
+                position = (sentence_index << TOKEN_BITS) | node.index
+                node_values = [(i, values[getattr(node, attribute)]) for i, attribute in enumerate(MASK_ATTRIBUTES[:-1])]
+                node_values.extend((feats_index, part) for part in node.feats.parts)
+                for value in node_values:
+                    if value in postings:
+                        postings[value].append(position)
+                    else:
+                        postings[value] = array('q', [position])
+                nodes.extend(node.children)
+        return index
+
+    def is_valid(self, document, path, configs):
+        """
+        Checks whether index was created from the same file (and with the same settings) as document.
+        :param document:
+        :param path:
+        :param configs:
+        :return:
+        """
+        return (self.source == self.get_source(path) and self.label_subtypes == configs['label_subtypes'] and
+                len(self.sentence_sizes) == len(document.trees))
+
+    def get_predicate_positions(self, predicate):
+        """
+        Returns set of positions of tokens that may fit predicate (see `AttributePredicate`), or None when any token
+        may fit it.
+        :param predicate:
+        :return:
+        """
+        if predicate is None:
+            return None
+        positions = set()
+        for option in predicate.options:
+            option_values = QueryPrefilter.get_option_values(option)
+            if not option_values:
+                return None
+            # intersection starts with the rarest value
+            option_postings = sorted((self.postings.get(value, ()) for value in option_values), key=len)
+            option_positions = set(option_postings[0])
+            for value_postings in option_postings[1:]:
+                option_positions.intersection_update(value_postings)
+            positions |= option_positions
+        return positions
+
+    def find_heads(self, query_trees, filters):
+        """
+        Finds sentences that may contain query trees (compiled by `compile_query_tree`). A sentence must have enough
+        tokens and, for every node of a query tree, a token that may fit it.
+        :param query_trees:
+        :param filters:
+        :return: Dictionary of indices of candidate sentences and sets of indices of tokens that may be heads of query
+        trees (None when any token may be a head).
+        """
+        heads = {}
+        root_whitelist_positions = self.get_predicate_positions(filters['root_whitelist_predicate'])
+        for query_tree in query_trees:
+            size = 1
+            nodes_positions = []
+            query_nodes = list(query_tree['children']) if 'children' in query_tree else []
+            while query_nodes:
+                query_node = query_nodes.pop()
+                size += 1
+                nodes_positions.append(self.get_predicate_positions(query_node.get('predicate')))
+                if 'children' in query_node:
+                    query_nodes.extend(query_node['children'])
+
+            root_positions = self.get_predicate_positions(query_tree.get('predicate'))
+            if root_positions is None:
+                root_positions = root_whitelist_positions
+            elif root_whitelist_positions is not None:
+                root_positions = root_positions & root_whitelist_positions
+            nodes_positions.append(root_positions)
+
+            sentences = None
+            for positions in nodes_positions:
+                if positions is not None:
+                    node_sentences = {position >> TOKEN_BITS for position in positions}
+                    sentences = node_sentences if sentences is None else sentences & node_sentences
+            if sentences is None:
+                sentences = range(len(self.sentence_sizes))
+            sentences = [sentence_index for sentence_index in sentences if self.sentence_sizes[sentence_index] >= size]
+
+            if root_positions is None:
+                for sentence_index in sentences:
+                    heads[sentence_index] = None
+                continue
+            sentence_heads = {}
+            for position in root_positions:
+                sentence_index = position >> TOKEN_BITS
+                if sentence_index in sentence_heads:
+                    sentence_heads[sentence_index].add(position & TOKEN_MASK)
+                else:
+                    sentence_heads[sentence_index] = {position & TOKEN_MASK}
+            for sentence_index in sentences:
+                if sentence_index not in heads:
+                    heads[sentence_index] = sentence_heads[sentence_index]
+                elif heads[sentence_index] is not None:
+                    heads[sentence_index] |= sentence_heads[sentence_index]
+        return heads
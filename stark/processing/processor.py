@@ -15,11 +15,14 @@
 import logging
 import os
 import time
+from multiprocessing import Pool
 from pathlib import Path
 
+from stark.data.summary import Summary
+from stark.data.vocabulary import attribute_vocabulary
 from stark.processing.cache import ProcessorCache
-from stark.processing.counters import QueryCounter, GreedyCounter
-from stark.processing.document_processor import DocumentProcessor
+from stark.processing.counters import QueryCounter, GreedyCounter, GreedyKeyCounter, initialize_worker
+from stark.processing.document_processor import DocumentProcessor, split_into_shards
 
 logger = logging.getLogger('stark')
 
@@ -31,6 +34,61 @@ class Processor(object):
     def __init__(self, configs, filters):
         self.configs = configs
         self.filters = filters
+        self.pool = None
+        self.pool_state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(terminate=exc_type is not None)
+
+    def get_counter_class(self, query_trees):
+        """
+        Returns counter class that is used. Greedy counter counts only keys of subtrees when no other output needs them.
+        :param query_trees:
+        :return:
+        """
+        if not self.configs['greedy_counter']:
+            return QueryCounter
+        if GreedyKeyCounter.is_applicable(query_trees, self.filters, self.configs):
+            return GreedyKeyCounter
+        return GreedyCounter
+
+    def get_pool(self, query_trees):
+        """
+        Returns pool of worker processes, that is created on first use and reused for all following documents (and
+        compared corpus). Pool is recreated only when data installed into workers changes.
+        :param query_trees: Query trees installed into workers.
+        :return:
+        """
+        counter_class = self.get_counter_class(query_trees)
+        pool_state = (counter_class, query_trees, dict(self.filters))
+        if self.pool is not None and self.pool_state != pool_state:
+            self.close()
+        if self.pool is None:
+            attribute_vocabulary.share()
+            self.pool = Pool(self.filters['cpu_cores'], initializer=initialize_worker,
+                             initargs=(counter_class, query_trees, self.filters, self.configs,
+                                       attribute_vocabulary.values))
+            self.pool_state = pool_state
+        return self.pool
+
+    def close(self, terminate=False):
+        """
+        Shuts down pool of worker processes.
+        :param terminate: Stops workers immediately, without waiting for them to finish.
+        :return:
+        """
+        if self.pool is None:
+            return
+        if terminate:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+        self.pool = None
+        self.pool_state = None
 
     def run_dir(self, summary):
         """
@@ -41,34 +99,100 @@ class Processor(object):
         processor_cache = ProcessorCache(self)
         summary = processor_cache.load_cache(summary)
 
-        for path in sorted(Path(self.configs['input_path']).rglob('*.conllu')):
+        paths = sorted(Path(self.configs['input_path']).rglob('*.conllu'))
+        if self.configs['parallel_files'] and self.filters['cpu_cores'] > 1:
+            return self.run_dir_parallel(paths, summary, processor_cache)
+
+        for path in paths:
             summary = processor_cache.process_trees(path, summary)
 
         return summary
 
-    def run(self, path, summary):
+    def run_dir_parallel(self, paths, summary, processor_cache):
+        """
+        Processes each file in a separate process, which parses and counts it into its own summary. Summaries are
+        merged in the original order of files, so results are the same as in sequential processing.
+        :param paths: Sorted paths of files in directory.
+        :param summary:
+        :param processor_cache:
+        :return:
+        """
+        paths = [path for path in paths if not processor_cache.is_processed(path)]
+        # every file is processed by a single core
+        file_configs = dict(self.configs, cpu_cores=1)
+        file_filters = dict(self.filters, cpu_cores=1)
+        file_summaries = self.get_pool(summary.query_trees).imap(
+            count_file, [(str(path), None, summary.query_trees, file_filters, file_configs) for path in paths])
+        for path, file_summary in zip(paths, file_summaries):
+            summary = summary.merge(file_summary, self.filters)
+            processor_cache.mark_processed(path, summary)
+
+        return summary
+
+    def run(self, path, summary, byte_range=None):
         """
         Run processing.
-        :param path_list: List of paths to documents that need to be processed.
+        :param path: Path to document that needs to be processed.
         :param summary: A collection of datapoints used for result generation.
+        :param byte_range: Optional (start, end) byte positions of the part of document that is processed.
         :return:
         summary: A collection of datapoints used for result generation.
         """
+        if self.configs['parallel_shards'] and self.filters['cpu_cores'] > 1 and byte_range is None:
+            return self.run_shards(path, summary)
+
         start_exe_time = time.time()
 
-        document_processor = DocumentProcessor(str(path), self)
-        document = document_processor.form_trees(summary, self.configs)
-        logger.info("Trees formed time:")
-        logger.info("--- %s seconds ---" % (time.time() - start_exe_time))
-        if self.configs['greedy_counter']:
-            tree_counter = GreedyCounter(document, summary, self.filters, self.configs)
+        document_processor = DocumentProcessor(str(path), self, byte_range)
+        if self.configs['streaming']:
+            # documents are parsed lazily, in batches, while they are being counted
+            documents = document_processor.iterate_trees(summary, self.configs)
         else:
-            tree_counter = QueryCounter(document, summary, self.filters, self.configs)
+            documents = [document_processor.form_trees(summary, self.configs)]
+            logger.info("Trees formed time:")
+            logger.info("--- %s seconds ---" % (time.time() - start_exe_time))
+        pool = self.get_pool(summary.query_trees) if self.filters['cpu_cores'] > 1 else None
+        counter_class = self.get_counter_class(summary.query_trees)
+        tree_counter = counter_class(documents, summary, self.filters, self.configs, pool)
         tree_counter.run()
-        summary.samples.extend(document.sentence_statistics)
 
         logger.info(f"{len(summary.representation_trees)} unique trees counted time (execution time):")
         logger.info("Trees counted time (execution time):")
         logger.info("--- %s seconds ---" % (time.time() - start_exe_time))
 
         return summary
+
+    def run_shards(self, path, summary):
+        """
+        Splits document into parts at sentence boundaries, which are parsed and counted by separate processes.
+        Partial summaries are merged in the original order, so results are the same as in sequential processing.
+        :param path: Path to document.
+        :param summary:
+        :return:
+        """
+        start_exe_time = time.time()
+        byte_ranges = split_into_shards(str(path), self.filters['cpu_cores'])
+        logger.info(f"Processing {path} in {len(byte_ranges)} shards")
+        # every shard is processed by a single core
+        shard_configs = dict(self.configs, cpu_cores=1)
+        shard_filters = dict(self.filters, cpu_cores=1)
+        shard_summaries = self.get_pool(summary.query_trees).map(
+            count_file, [(str(path), byte_range, summary.query_trees, shard_filters, shard_configs)
+                         for byte_range in byte_ranges])
+        summary = Summary.reduce([summary] + shard_summaries, self.filters)
+
+        logger.info("Shards counted time (execution time):")
+        logger.info("--- %s seconds ---" % (time.time() - start_exe_time))
+        return summary
+
+
+def count_file(input_data):
+    """
+    Parses and counts a single file (or its part) into a new summary. Used by worker processes.
+    :param input_data: A tuple containing path, byte range, query trees, filters and configs.
+    :return:
+    """
+    path, byte_range, query_trees, filters, configs = input_data
+    summary = Summary()
+    summary.set_query_trees(query_trees)
+    return Processor(configs, filters).run(path, summary, byte_range)
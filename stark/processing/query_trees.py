@@ -12,99 +12,119 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
-from stark.resources.constants import UNIVERSAL_FEATURES
+import json
+import os
 
+from stark.data.vocabulary import attribute_vocabulary
+from stark.processing.filters import AttributePredicate
+from stark.resources.constants import UNIVERSAL_FEATURES
 
-def add_node(tree):
-    """
-    Adds node to a tree.
-    :param tree:
-    :return:
-    """
-    if 'children' in tree:
-        tree['children'].append({})
-    else:
-        tree['children'] = [{}]
+# catalog of query tree shapes by size (see `scripts/create_query_shapes.py`), loaded on first use
+QUERY_SHAPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../resources/query_shapes.json')
+query_shapes_catalog = None
 
 
 def tree_grow(orig_tree):
     """
-    Walks over all nodes in tree and add a node to each possible node.
+    Walks over all nodes in tree and add a node to each possible node. New trees share unchanged subtrees with
+    original tree.
     :param orig_tree:
     :return:
     """
-    new_trees = []
-    new_tree = copy.deepcopy(orig_tree)
-    add_node(new_tree)
-    new_trees.append(new_tree)
-    if 'children' in orig_tree:
-        children = []
-        for child_tree in orig_tree['children']:
-            children.append(tree_grow(child_tree))
-        for i, child in enumerate(children):
-            for child_res in child:
-                new_tree = copy.deepcopy(orig_tree)
-                new_tree['children'][i] = child_res
-                new_trees.append(new_tree)
+    children = orig_tree['children'] if 'children' in orig_tree else []
+    new_trees = [{'children': children + [{}]}]
+    for i, child_tree in enumerate(children):
+        for child_res in tree_grow(child_tree):
+            new_children = list(children)
+            new_children[i] = child_res
+            new_trees.append({'children': new_children})
 
     return new_trees
 
 
-def compare_trees(tree1, tree2):
+def get_shape_key(tree):
     """
-    Compares two trees and returns True, when they match.
-    :param tree1:
-    :param tree2:
+    Returns canonical key of a shape of tree, that is equal for all trees that differ only in order of children.
+    :param tree:
     :return:
     """
-    if tree1 == {} and tree2 == {}:
-        return True
+    if 'children' not in tree:
+        return '()'
+    return '(' + ''.join(sorted(get_shape_key(child) for child in tree['children'])) + ')'
 
-    if 'children' not in tree1 or 'children' not in tree2 or len(tree1['children']) != len(tree2['children']):
-        return False
 
-    children2_connections = []
+def shape_to_string(tree):
+    """
+    Writes shape of tree as brackets (a pair for every node), keeping order of children.
+    :param tree:
+    :return:
+    """
+    if 'children' not in tree:
+        return '()'
+    return '(' + ''.join(shape_to_string(child) for child in tree['children']) + ')'
 
-    for child1_i, child1 in enumerate(tree1['children']):
-        child_duplicated = False
-        for child2_i, child2 in enumerate(tree2['children']):
-            if child2_i in children2_connections:
-                pass
-            if compare_trees(child1, child2):
-                children2_connections.append(child2_i)
-                child_duplicated = True
-                break
-        if not child_duplicated:
-            return False
 
-    return True
+def shape_from_string(shape):
+    """
+    Reads shape written by `shape_to_string`.
+    :param shape:
+    :return:
+    """
+    stack = [{}]
+    for bracket in shape[1:]:
+        if bracket == '(':
+            stack.append({})
+        else:
+            tree = stack.pop()
+            if not stack:
+                return tree
+            if 'children' in stack[-1]:
+                stack[-1]['children'].append(tree)
+            else:
+                stack[-1]['children'] = [tree]
+    raise ValueError('Shape is not formatted properly: ' + shape)
 
 
 def create_ngrams_query_trees(n, trees):
     """
-    Forms unique ngram query trees.
+    Forms unique ngram query trees. Trees are grown by a node at a time, trees that only differ in order of children
+    are recognized by their shape keys.
     :param n:
     :param trees:
     :return:
     """
     for i in range(n - 1):
         new_trees = []
+        new_trees_keys = set()
         for tree in trees:
             # append new_tree only if it is not already inside
             for new_tree in tree_grow(tree):
-                duplicate = False
-                for confirmed_new_tree in new_trees:
-                    if compare_trees(new_tree, confirmed_new_tree):
-                        duplicate = True
-                        break
-                if not duplicate:
+                new_tree_key = get_shape_key(new_tree)
+                if new_tree_key not in new_trees_keys:
+                    new_trees_keys.add(new_tree_key)
                     new_trees.append(new_tree)
 
         trees = new_trees
     return trees
 
 
+def get_query_shapes(n):
+    """
+    Returns all query trees (shapes without restrictions) of size n. Shapes are read from catalog, larger ones are
+    grown from the largest shapes in catalog.
+    :param n:
+    :return:
+    """
+    global query_shapes_catalog
+    if query_shapes_catalog is None:
+        with open(QUERY_SHAPES_PATH, 'r') as f:
+            query_shapes_catalog = {int(size): shapes for size, shapes in json.load(f).items()}
+    if n in query_shapes_catalog:
+        return [shape_from_string(shape) for shape in query_shapes_catalog[n]]
+    largest_size = max(query_shapes_catalog)
+    return create_ngrams_query_trees(n - largest_size + 1, get_query_shapes(largest_size))
+
+
 def split_query_text(input_string):
     """
     Splits query by ignoring everything in brackets and otherwise splitting by spaces.
@@ -160,7 +180,7 @@ def decode_query(orig_query, dependency_type):
             else:
                 negation = False
             if dependency_type_el:
-                dependency_restrictions.append((negation, dependency_type_el))
+                dependency_restrictions.append((negation, attribute_vocabulary.get_id(dependency_type_el)))
     else:
         dependency_restrictions = None
 
@@ -183,13 +203,13 @@ def decode_query(orig_query, dependency_type):
                 orig_query_split = orig_query_split_part.split('=', 1)
                 if len(orig_query_split) > 1:
                     if orig_query_split[0] == 'L':
-                        restriction['lemma'] = (negation, orig_query_split[1])
+                        restriction['lemma'] = (negation, attribute_vocabulary.get_id(orig_query_split[1]))
                     elif orig_query_split[0] == 'upos':
-                        restriction['upos'] = (negation, orig_query_split[1])
+                        restriction['upos'] = (negation, attribute_vocabulary.get_id(orig_query_split[1]))
                     elif orig_query_split[0] == 'xpos':
-                        restriction['xpos'] = (negation, orig_query_split[1])
+                        restriction['xpos'] = (negation, attribute_vocabulary.get_id(orig_query_split[1]))
                     elif orig_query_split[0] == 'form':
-                        restriction['form'] = (negation, orig_query_split[1])
+                        restriction['form'] = (negation, attribute_vocabulary.get_id(orig_query_split[1]))
                     elif orig_query_split[0] == 'feats':
                         restriction['feats'] = (negation, orig_query_split[1])
                     elif orig_query_split[0] in UNIVERSAL_FEATURES:
@@ -200,7 +220,7 @@ def decode_query(orig_query, dependency_type):
                     else:
                         raise Exception('Unexpected behaviour!')
                 elif not new_query:
-                    restriction['form'] = (negation, orig_query_split_part)
+                    restriction['form'] = (negation, attribute_vocabulary.get_id(orig_query_split_part))
             decoded_query['restrictions'].append(restriction)
 
         # merge restrictions from dependencies and other restrictions (this solves 'or' cases in both simultaneously)
@@ -241,6 +261,22 @@ def decode_query(orig_query, dependency_type):
     return root
 
 
+def compile_query_tree(query_tree):
+    """
+    Compiles restrictions of all nodes of a decoded query tree into predicates (see `AttributePredicate`).
+    :param query_tree:
+    :return: The same query tree.
+    """
+    query_nodes = [query_tree]
+    while query_nodes:
+        query_node = query_nodes.pop()
+        if 'restrictions' in query_node and query_node['restrictions']:
+            query_node['predicate'] = AttributePredicate.from_query_restrictions(query_node['restrictions'])
+        if 'children' in query_node:
+            query_nodes.extend(query_node['children'])
+    return query_tree
+
+
 def generate_query_trees(configs, filters):
     """
     Generates query trees based on configs and filters.
@@ -251,17 +287,17 @@ def generate_query_trees(configs, filters):
     query_tree = []
     if filters['tree_size_range'][0] > 0:
         if len(filters['tree_size_range']) == 1:
-            query_tree = create_ngrams_query_trees(filters['tree_size_range'][0], [{}])
+            query_tree = get_query_shapes(filters['tree_size_range'][0])
         elif len(filters['tree_size_range']) == 2:
             query_tree = []
             for i in range(filters['tree_size_range'][0], filters['tree_size_range'][1] + 1):
-                query_tree.extend(create_ngrams_query_trees(i, [{}]))
+                query_tree.extend(get_query_shapes(i))
     else:
-        if filters['tree_size_range'][0] == 0 and 'query' not in configs:
+        if filters['tree_size_range'][0] == 0 and 'query' not in configs and 'queries' not in configs:
             raise ValueError('You should specify either tree_size or query!')
-        query = configs['query']
-        query_tree = [decode_query('(' + query + ')', '')]
-        if query_tree == [{}]:
+        queries = configs['queries'] if 'queries' in configs else [configs['query']]
+        query_tree = [compile_query_tree(decode_query('(' + query + ')', '')) for query in queries]
+        if {} in query_tree:
             raise ValueError('Query is not formatted properly!')
 
     return query_tree
@@ -15,6 +15,7 @@
 
 import csv
 import hashlib
+import heapq
 import json
 import math
 import os
@@ -29,6 +30,8 @@ import urllib.parse
 import logging
 from tqdm import tqdm
 
+from stark.data.vocabulary import translate_key
+
 here = path.abspath(path.dirname(__file__))
 logging.basicConfig(level=logging.NOTSET)
 logger = logging.getLogger('stark')
@@ -77,7 +80,12 @@ class Writer(object):
         else:
             sorted_list = self.summary.representation_trees.items()
 
-        sorted_list = sorted(sorted_list, key=lambda x: (-x[1]['number'], x[0]))
+        # keys are rendered only for trees that may be written (ties are ordered by rendered keys)
+        if self.filters['lines_threshold'] and len(sorted_list) > self.filters['lines_threshold']:
+            min_number = heapq.nlargest(self.filters['lines_threshold'], (v['number'] for k, v in sorted_list))[-1]
+            sorted_list = [(k, v) for k, v in sorted_list if v['number'] >= min_number]
+        sorted_list = sorted([(self.render_key(k), k, v) for k, v in sorted_list],
+                             key=lambda x: (-x[2]['number'], x[0][0]))
 
         with open(os.path.join(here, '../resources/codes_mapper.json'), 'r') as f:
             codes_mapper = json.load(f)
@@ -137,9 +145,13 @@ class Writer(object):
         if self.filters['lines_threshold']:
             sorted_list = sorted_list[:self.filters['lines_threshold']]
 
+        if self.other_summary and self.other_summary.vocabulary is not self.summary.vocabulary:
+            other_mapping = self.summary.vocabulary.get_lookup_mapping(self.other_summary.vocabulary)
+        else:
+            other_mapping = None
+
         # body
-        for k, v in tqdm(sorted_list, desc='Writing'):
-            literal_key = v['key']
+        for (k_string, literal_key), k, v in tqdm(sorted_list, desc='Writing'):
             word_array = v['word_array']
 
             relative_frequency = v['number'] * 1000000.0 / self.summary.corpus_size
@@ -185,16 +197,27 @@ class Writer(object):
                         min_sentence_size = s[3]
                 row += final_row
             if self.filters['annodoc'] and (self.configs['detailed_results_file'] or self.filters['example']):
-                annodoc_dict = {'id': v['sentence'][random_sentence_position][0],'positions': v['sentence'][random_sentence_position][2][1],'subtree_hash': hashlib.sha1(k.encode('utf-8')).hexdigest()}
+                annodoc_dict = {'id': v['sentence'][random_sentence_position][0],'positions': v['sentence'][random_sentence_position][2][1],'subtree_hash': hashlib.sha1(k_string.encode('utf-8')).hexdigest()}
                 annodoc_json = json.dumps(annodoc_dict)
                 row += [annodoc_json]
             if self.filters['association_measures']:
                 row += self.get_collocabilities(v, self.summary.unigrams, self.summary.corpus_size)
             if self.configs['compare']:
-                other_abs_freq = other_representation_trees[k]['number'] if k in other_representation_trees else 0
+                other_k = translate_key(k, other_mapping) if other_mapping is not None else k
+                other_abs_freq = other_representation_trees[other_k]['number'] \
+                    if other_k is not None and other_k in other_representation_trees else 0
                 row += self.get_keyness(v['number'], other_abs_freq, self.summary.corpus_size, other_corpus_size)
             yield row
 
+    def render_key(self, key):
+        """
+        Returns string form of a key of summary, with and without order letters.
+        :param key:
+        :return:
+        """
+        literal_key, order_letters = self.summary.vocabulary.render_key(key)
+        return literal_key + order_letters, literal_key
+
     def write_sentence_count_file(self):
         """
         Writes into sentence count file.
@@ -204,11 +227,11 @@ class Writer(object):
             os.remove(self.configs['sentence_count_file'])
         with open(self.configs['sentence_count_file'], "a", newline="", encoding="utf-8") as wf:
             key_list = [k for k, v in self.summary.representation_trees.items()]
-            header = ['Sentence_id'] + key_list
+            header = ['Sentence_id'] + [self.render_key(k)[0] for k in key_list]
             wf.write('\t'.join(header) + '\n')
-            for sentence in self.summary.samples:
-                wf.write(sentence['id'] + '\t' + '\t'.join(
-                    [str(sentence['count'][k]) if k in sentence['count'] else '0' for k in key_list]) + '\n')
+            for sentence_id, counts in self.summary.samples:
+                wf.write(sentence_id + '\t' + '\t'.join(
+                    [str(counts[k]) if k in counts else '0' for k in key_list]) + '\n')
 
     def write_detailed_results_file(self):
         """
@@ -219,8 +242,9 @@ class Writer(object):
             os.remove(self.configs['detailed_results_file'])
         with open(self.configs['detailed_results_file'], "a", newline="", encoding="utf-8") as wf:
             for k, v in self.summary.representation_trees.items():
+                k_string = self.render_key(k)[0]
                 for s in v['sentence']:
-                    wf.write(k + '\t' + s[0] + '\t' + s[1] + '\n')
+                    wf.write(k_string + '\t' + s[0] + '\t' + s[1] + '\n')
 
     def write_annodoc_files(self):
         """
@@ -250,7 +274,7 @@ class Writer(object):
             shutil.rmtree(annodoc_dir, ignore_errors=True)
         annodoc_dir.mkdir()
         for k, v in self.summary.representation_trees.items():
-            path = hashlib.sha1(k.encode('utf-8')).hexdigest()
+            path = hashlib.sha1(self.render_key(k)[0].encode('utf-8')).hexdigest()
             annodoc_path = Path(self.configs['annodoc_detailed_dir'], path) # calculate hash?
             if not annodoc_path.exists():
                 with open(annodoc_path, "w", newline="",
@@ -321,8 +345,7 @@ class Writer(object):
                 elif node_type == 'generic':
                     node_result[location_mapper[node.location]].append(f'')
                 elif node_type == 'feats':
-                    for k, v in node.feats.items():
-                        node_result[location_mapper[node.location]].append(f'{k}={v}')
+                    node_result[location_mapper[node.location]].extend(node.feats.parts)
                 else:
                     node_result[location_mapper[node.location]].append(f'form="{node.node.form}"')
         link_result = []
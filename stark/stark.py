@@ -24,6 +24,7 @@ from stark.data.representation.empty_namespace import EmptyNamespace
 # from pympler import asizeof
 
 from stark.data.summary import Summary
+from stark.processing.document_processor import DocumentProcessor
 from stark.processing.filters import read_filters
 from stark.processing.processor import Processor
 from stark.processing.query_trees import generate_query_trees, get_query_tree_size_range
@@ -32,6 +33,7 @@ from stark.processing.writers import TSVWriter, ObjectWriter
 logging.basicConfig(level=logging.NOTSET)
 logger = logging.getLogger('stark')
 
+# greedy counting does not recurse through sentences, query trees are still matched recursively
 sys.setrecursionlimit(25000)
 
 
@@ -50,7 +52,21 @@ def parse_args(args):
     parser.add_argument("--output", default=None, type=str, help="The output file.")
     parser.add_argument("--internal_saves", default=None, type=str, help="Location for internal_saves.")
     parser.add_argument("--cpu_cores", default=None, type=int, help="Number of cores used.")
+    parser.add_argument("--chunk_size", default=None, type=int,
+                        help="Number of sentences sent to a processor at once.")
     parser.add_argument("--greedy_counter", default=None, type=str, help="Uses greedy counter.")
+    parser.add_argument("--worker_aggregation", default=None, type=str,
+                        help="Processors count whole chunks of sentences and return partial results.")
+    parser.add_argument("--parallel_files", default=None, type=str,
+                        help="Processes files of input directory in parallel.")
+    parser.add_argument("--parallel_shards", default=None, type=str,
+                        help="Splits input files into parts that are processed in parallel.")
+    parser.add_argument("--conllu_reader", default=None, type=str,
+                        help="Library used for reading conllu files (pyconll or native).")
+    parser.add_argument("--streaming", default=None, type=str,
+                        help="Reads input files in batches of sentences instead of all at once.")
+    parser.add_argument("--batch_size", default=None, type=int,
+                        help="Number of sentences held in memory at once when streaming.")
 
     parser.add_argument("--size", default=None, type=str, help="Size of trees displayed.")
     parser.add_argument("--processing_size", default=None, type=str, help="Limits the size of trees during processing.")
@@ -66,6 +82,8 @@ def parse_args(args):
     parser.add_argument("--head", default=None, type=str, help="Head whitelist.")
 
     parser.add_argument("--query", default=None, type=str, help="Query.")
+    parser.add_argument("--query_file", default=None, type=str,
+                        help="Path to a file with one query per line, which are counted in a single pass.")
 
     # output settings
     parser.add_argument("--grew_match", default=None, type=str, help="Output setting for printing query and url.")
@@ -91,14 +109,18 @@ def parse_args(args):
     return parser.parse_args(args)
 
 
-def count_subtrees(configs, filters):
+def count_subtrees(configs, filters, processor=None):
     """
     Counts subtrees that match filters.
     :param configs:
     :param filters:
+    :param processor: Processor (with its pool of workers) that is reused between calls. A new one is used if not given.
     :return:
     """
-    processor = Processor(configs, filters)
+    if processor is None:
+        with Processor(configs, filters) as processor:
+            return count_subtrees(configs, filters, processor)
+
     summary = Summary()
     if not configs['greedy_counter'] or filters['tree_size_range'][0] == 0:
         summary.set_query_trees(generate_query_trees(configs, filters))
@@ -148,6 +170,22 @@ def read_configs(config, args=EmptyNamespace()):
         if not args.internal_saves else args.internal_saves
     configs['cpu_cores'] = (config.getint('settings', 'cpu_cores') if config.has_option('settings', 'cpu_cores')
                             else 1) if not args.cpu_cores else args.cpu_cores
+    configs['chunk_size'] = config.getint('settings', 'chunk_size', fallback=50) \
+        if not args.chunk_size else args.chunk_size
+    configs['worker_aggregation'] = config.getboolean('settings', 'worker_aggregation', fallback=False) \
+        if not args.worker_aggregation else args.worker_aggregation == 'yes'
+    configs['parallel_files'] = config.getboolean('settings', 'parallel_files', fallback=False) \
+        if not args.parallel_files else args.parallel_files == 'yes'
+    configs['parallel_shards'] = config.getboolean('settings', 'parallel_shards', fallback=False) \
+        if not args.parallel_shards else args.parallel_shards == 'yes'
+    configs['conllu_reader'] = config.get('settings', 'conllu_reader', fallback='pyconll') \
+        if not args.conllu_reader else args.conllu_reader
+    if configs['conllu_reader'] not in ['pyconll', 'native']:
+        raise ValueError('`conllu_reader` has to be either `pyconll` or `native`!')
+    configs['streaming'] = config.getboolean('settings', 'streaming', fallback=False) \
+        if not args.streaming else args.streaming == 'yes'
+    configs['batch_size'] = config.getint('settings', 'batch_size', fallback=10000) \
+        if not args.batch_size else args.batch_size
     configs['complete_tree_type'] = (config.getboolean('settings', 'complete') if not args.complete
                                      else args.complete == 'yes')
     configs['dependency_type'] = (config.getboolean('settings', 'labeled') if not args.labeled
@@ -187,6 +225,18 @@ def read_configs(config, args=EmptyNamespace()):
         configs['display_size'] = '0'
         configs['tree_size'] = '0'
 
+    # query and query_file exclude each other, arguments override settings from configuration file
+    if args.query_file or (config.has_option('settings', 'query_file') and not args.query):
+        if args.query or (config.has_option('settings', 'query') and not args.query_file):
+            raise ValueError('Only one of `query` and `query_file` can be set!')
+        if configs['greedy_counter']:
+            raise ValueError('`query_file` can only be used with query counter (`greedy_counter` = no)!')
+        configs.pop('query', None)
+        configs['queries'] = read_queries(config.get('settings', 'query_file') if not args.query_file
+                                          else args.query_file)
+        configs['display_size'] = '0'
+        configs['tree_size'] = '0'
+
     if args.compare:
         configs['compare'] = args.compare
     else:
@@ -252,6 +302,37 @@ def read_configs(config, args=EmptyNamespace()):
     return configs
 
 
+def read_queries(query_file):
+    """
+    Reads queries from a file with one query per line. Empty lines and lines starting with # are skipped.
+    :param query_file: Path to file with queries.
+    :return: List of queries.
+    """
+    with open(query_file, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f]
+    queries = [query for query in queries if query and not query.startswith('#')]
+    if not queries:
+        raise ValueError('`query_file` does not contain any queries!')
+    return queries
+
+
+def get_query_configs(configs, query_index):
+    """
+    Returns settings for writing results of a single query from query_file. Results of every query are written into
+    their own files, whose names end with number of query (e.g. results_1.tsv for the first query of results.tsv).
+    :param configs: Dictionary containing execution settings.
+    :param query_index: Index of query in query_file.
+    :return:
+    """
+    query_configs = dict(configs, query=configs['queries'][query_index])
+    for name in ['output', 'sentence_count_file', 'detailed_results_file', 'annodoc_example_dir',
+                 'annodoc_detailed_dir']:
+        if configs[name]:
+            path = Path(configs[name])
+            query_configs[name] = str(path.with_name(f'{path.stem}_{query_index + 1}{path.suffix}'))
+    return query_configs
+
+
 def read_settings(config_file, args=EmptyNamespace()):
     """
     Reads configuration file and merges it with arguments.
@@ -265,20 +346,67 @@ def read_settings(config_file, args=EmptyNamespace()):
     return read_configs(config, args)
 
 
+def create_index(configs):
+    """
+    Creates inverted indices of input files (see `CorpusIndex`) in internal_saves, which are used when the same files
+    are searched with queries later. Trees of files are stored as well.
+    :param configs: Dictionary containing execution settings.
+    :return: Number of indexed sentences.
+    """
+    if configs['internal_saves'] is None:
+        raise ValueError('`internal_saves` has to be set to create index!')
+    # indices are only used by query counter, so trees are stored in its form
+    configs = dict(configs, greedy_counter=False)
+    filters = read_filters(configs)
+    if os.path.isdir(configs['input_path']):
+        paths = sorted(Path(configs['input_path']).rglob('*.conllu'))
+    else:
+        paths = [configs['input_path']]
+    sentences_number = 0
+    with Processor(configs, filters) as processor:
+        for path in paths:
+            sentences_number += DocumentProcessor(str(path), processor).create_index(Summary(), configs)
+    logger.info(f"{sentences_number} sentences of {len(paths)} files indexed")
+    return sentences_number
+
+
 def run(configs):
     """
     Executes STARK processing.
     :param configs: Dictionary containing execution settings.
-    :return: Either object with results or None, when results are stored into tsv file.
+    :return: Either object with results (a list of them, one for each query of query_file) or None, when results are
+    stored into tsv file.
     """
 
     filters = read_filters(configs)
-    summary = count_subtrees(configs, filters)
-
-    other_summary = None
-    if configs['compare'] is not None:
-        configs['input_path'] = configs['other_input_path']
-        other_summary = count_subtrees(configs, filters)
+    # the same processor (and its pool of workers) is used for both corpora
+    with Processor(configs, filters) as processor:
+        summary = count_subtrees(configs, filters, processor)
+
+        other_summary = None
+        if configs['compare'] is not None:
+            configs['input_path'] = configs['other_input_path']
+            other_summary = count_subtrees(configs, filters, processor)
+    if 'queries' not in configs:
+        return write_results(summary, other_summary, filters, configs)
+
+    # all queries are counted together, but results of each of them are written separately
+    summaries = summary.split_queries()
+    other_summaries = other_summary.split_queries() if other_summary is not None else [None] * len(summaries)
+    results = [write_results(query_summary, other_query_summary, filters, get_query_configs(configs, query_index))
+               for query_index, (query_summary, other_query_summary) in enumerate(zip(summaries, other_summaries))]
+    return None if configs['output'] else results
+
+
+def write_results(summary, other_summary, filters, configs):
+    """
+    Writes results into tsv file or returns them in object, when output is not given.
+    :param summary:
+    :param other_summary: Summary of compared corpus or None.
+    :param filters:
+    :param configs:
+    :return:
+    """
     if configs['output']:
         writer = TSVWriter(summary, other_summary, filters, configs)
     else:
@@ -18,18 +18,56 @@ import re
 from pathlib import Path
 
 
-def save_zipped_pickle(obj, filename, protocol=-1):
+def save_zipped_pickle(obj, filename, protocol=-1, compresslevel=9, header=b''):
     Path(filename).parent.mkdir(parents=True, exist_ok=True)
-    with gzip.open(filename, 'wb') as f:
+    with gzip.open(filename, 'wb', compresslevel=compresslevel) as f:
+        f.write(header)
         pickle.dump(obj, f, protocol)
 
 
-def load_zipped_pickle(filename):
+def load_zipped_pickle(filename, header=b''):
+    """
+    Loads object stored by `save_zipped_pickle`.
+    :param filename:
+    :param header: Bytes that are stored before object. When file does not start with them, object is not loaded.
+    :return: Loaded object or None, when header does not match.
+    """
     with gzip.open(filename, 'rb') as f:
+        if f.read(len(header)) != header:
+            return None
         loaded_object = pickle.load(f)
         return loaded_object
 
 
+def has_perfect_matching(candidates):
+    """
+    Checks whether every element of one side of a bipartite graph can be matched with a different element of the other
+    side (e.g. children of a tree with children of a query node). Graphs are small, so matching is found with simple
+    augmenting paths (Kuhn's algorithm), with shortcuts for one and two elements.
+    :param candidates: A list with a list of acceptable elements of the other side for every element.
+    :return:
+    """
+    if len(candidates) == 1:
+        return bool(candidates[0])
+    if len(candidates) == 2:
+        first, second = candidates
+        return any(a != b for a in first for b in second)
+
+    # elements of this side by matched elements of the other side
+    matches = {}
+
+    def augment(element, visited):
+        for candidate in candidates[element]:
+            if candidate not in visited:
+                visited.add(candidate)
+                if candidate not in matches or augment(matches[candidate], visited):
+                    matches[candidate] = element
+                    return True
+        return False
+
+    return all(augment(element, set()) for element in range(len(candidates)))
+
+
 def printable_answers(query):
     all_orders = re.split(r"\s+(?=[^()]*(?:\(|$))", query)
     node_actions = all_orders[::2]
@@ -74,7 +112,7 @@ def create_output_string_none(tree):
 
 
 def create_output_string_feats(tree):
-    return '|'.join([f'{k}={list(v.keys())[0]}' for k, v in tree.feats_detailed.items()])
+    return tree.feats.string
 
 
 def create_output_string_misc(tree):
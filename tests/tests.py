@@ -5,7 +5,14 @@ import shutil
 
 import pytest
 import stark
-from stark.stark import read_settings, parse_args
+from stark.data.summary import Summary
+from stark.processing.counters import GreedyCounter, GreedyKeyCounter
+from stark.processing.document_processor import DocumentProcessor
+from stark.processing.filters import read_filters
+from stark.processing.processor import Processor
+from stark.processing.writers import TSVWriter
+from stark.stark import read_settings, parse_args, count_subtrees
+from stark.utils import save_zipped_pickle
 from tests import *
 
 
@@ -167,6 +174,65 @@ def test_internal_storage2():
     assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_internal_storage2.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
                                                                                            'out_internal_storage2.tsv'))
 
+    # caches of older formats (without header) are created again
+    for cache_file in os.listdir(output_mapper_dir):
+        save_zipped_pickle([[], [], 0], os.path.join(output_mapper_dir, cache_file), protocol=2)
+    random.seed(12)
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_internal_storage2.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
+                                                                                           'out_internal_storage2.tsv'))
+
+
+def test_index():
+    """
+    Test query on indexed input.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    output_mapper_dir = 'test_data/output/internal_saves'
+    if os.path.exists(output_mapper_dir):
+        shutil.rmtree(output_mapper_dir)
+    settings = read_settings(config_file, parse_args(['--internal_saves', output_mapper_dir]))
+    stark.create_index(settings)
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+    for output_file, args in [('out_index.tsv', ['--internal_saves', output_mapper_dir, '--cpu_cores', '2']),
+                              ('out_not_indexed.tsv', [])]:
+        random.seed(12)
+        settings = read_settings(config_file, parse_args(args + ['--head', 'Number=Sing', '--query', 'upos=NOUN > _ > _',
+                                                                 '--output', os.path.join(OUTPUT_DIR, output_file)]))
+        stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_index.tsv'), os.path.join(OUTPUT_DIR, 'out_not_indexed.tsv'))
+
+    # greedy counter does not use trees stored for query counter
+    random.seed(12)
+    settings = read_settings(config_file, parse_args(['--internal_saves', output_mapper_dir, '--greedy_counter', 'yes',
+                                                      '--output', os.path.join(OUTPUT_DIR, 'out_index_greedy.tsv')]))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_index_greedy.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
+                                                                                      'out_query.tsv'))
+
+
+def test_query_file():
+    """
+    Test multiple queries from query file, which are counted in a single pass.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--query_file', os.path.join(CONFIGS_DIR, 'queries.txt'),
+                                                      '--output', os.path.join(OUTPUT_DIR, 'out_queries.tsv')]))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_queries_1.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+    random.seed(12)
+    settings = read_settings(config_file, parse_args(['--query', 'upos=VERB >nsubj _ >obj _',
+                                                      '--output', os.path.join(OUTPUT_DIR, 'out_single_query.tsv')]))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_queries_2.tsv'), os.path.join(OUTPUT_DIR, 'out_single_query.tsv'))
+
 
 def test_output_settings():
     """
@@ -198,3 +264,216 @@ def test_output_settings():
                                                                                            'detailed_results_file_greedy.tsv'))
     assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'sentence_count_file_greedy.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
                                                                                          'sentence_count_file_greedy.tsv'))
+
+
+def test_streaming():
+    """
+    Test streaming input in batches.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--streaming', 'yes', '--batch_size', '50']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_base.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_base.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--streaming', 'yes', '--batch_size', '50',
+                                                      '--greedy_counter', 'yes']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+
+def test_native_reader():
+    """
+    Test native conllu reader.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--conllu_reader', 'native']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_base.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_base.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--conllu_reader', 'native', '--greedy_counter', 'yes']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+
+def test_native_reader_invalid_lines():
+    """
+    Test that native conllu reader rejects malformed token lines.
+    :return:
+    """
+    _, tokens, _ = DocumentProcessor._create_native_sentence(
+        ['# sent_id = 1', '1\tHe\the\tPRON\t_\tCase=Nom|PronType=Prs,Dem\t0\troot\t_\t_'])
+    assert tokens[0][7] == {'Case': {'Nom'}, 'PronType': {'Prs', 'Dem'}}
+
+    for feats in ['Foo', 'Case=Nom|', 'Case=', '=Nom']:
+        with pytest.raises(ValueError, match='Invalid feats'):
+            DocumentProcessor._create_native_sentence(['1\tHe\the\tPRON\t_\t' + feats + '\t0\troot\t_\t_'])
+
+    with pytest.raises(ValueError, match='number of columns'):
+        DocumentProcessor._create_native_sentence(['1\tHe\the\tPRON\t_\t_\t0\troot'])
+
+
+def test_parallel_files():
+    """
+    Test processing files of a directory in parallel.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--input', 'test_data/input/dir_input/',
+                                                      '--output', 'test_data/output/out_dir.tsv',
+                                                      '--parallel_files', 'yes', '--cpu_cores', '2']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_dir.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_dir.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    output_mapper_dir = 'test_data/output/internal_saves'
+    if os.path.exists(output_mapper_dir):
+        shutil.rmtree(output_mapper_dir)
+    settings = read_settings(config_file, parse_args(['--input', 'test_data/input/dir_input/',
+                                                      '--output', 'test_data/output/out_dir.tsv',
+                                                      '--internal_saves', output_mapper_dir,
+                                                      '--continuation_processing', 'yes',
+                                                      '--greedy_counter', 'yes',
+                                                      '--parallel_files', 'yes', '--cpu_cores', '2']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_dir.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_dir.tsv'))
+
+
+def test_summary_merge():
+    """
+    Test merging summaries of separately processed files.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--input', 'test_data/input/dir_input/',
+                                                      '--output', 'test_data/output/out_dir.tsv']))
+    filters = read_filters(settings)
+    summaries = [Summary()]
+    for path in sorted(os.listdir(settings['input_path'])):
+        summaries.append(count_subtrees(dict(settings, input_path=os.path.join(settings['input_path'], path)),
+                                        filters))
+    summary = Summary.reduce(summaries, filters)
+    TSVWriter(summary, None, filters, settings).write()
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_dir.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_dir.tsv'))
+
+
+def test_parallel_shards():
+    """
+    Test processing parts of a file in parallel.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--parallel_shards', 'yes', '--cpu_cores', '3']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_base.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_base.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--parallel_shards', 'yes', '--cpu_cores', '3',
+                                                      '--greedy_counter', 'yes']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+
+def test_multiprocessing():
+    """
+    Test counting sentences on multiple cores.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--cpu_cores', '2', '--chunk_size', '7']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_base.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_base.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--cpu_cores', '2', '--greedy_counter', 'yes']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+
+def test_worker_aggregation():
+    """
+    Test counting chunks of sentences in worker processes.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_output_settings.ini')
+    settings = read_settings(config_file, parse_args(['--detailed_results_file',
+                                                      'test_data/output/detailed_results_file_query.tsv',
+                                                      '--cpu_cores', '2', '--worker_aggregation', 'yes',
+                                                      '--chunk_size', '20']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_output_settings.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
+                                                                                         'out_output_settings.tsv'))
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'detailed_results_file_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
+                                                                                           'detailed_results_file_query.tsv'))
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'sentence_count_file.tsv'), os.path.join(CORRECT_OUTPUT_DIR,
+                                                                                         'sentence_count_file.tsv'))
+
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_query.ini')
+    settings = read_settings(config_file, parse_args(['--cpu_cores', '2', '--worker_aggregation', 'yes',
+                                                      '--chunk_size', '20']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_query.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_query.tsv'))
+
+
+def test_persistent_pool():
+    """
+    Test reusing pool of workers for both compared corpora.
+    :return:
+    """
+    random.seed(12)
+    config_file = os.path.join(CONFIGS_DIR, 'config_compare.ini')
+    settings = read_settings(config_file, parse_args(['--cpu_cores', '2']))
+    stark.run(settings)
+    assert filecmp.cmp(os.path.join(OUTPUT_DIR, 'out_compare.tsv'), os.path.join(CORRECT_OUTPUT_DIR, 'out_compare.tsv'))
+
+    config_file = os.path.join(CONFIGS_DIR, 'config_base.ini')
+    settings = read_settings(config_file, parse_args(['--cpu_cores', '2']))
+    filters = read_filters(settings)
+    with Processor(settings, filters) as processor:
+        pool = processor.get_pool(None)
+        assert processor.get_pool(None) is pool
+        assert processor.get_pool([{}]) is not pool
+    assert processor.pool is None
+
+
+def test_greedy_key_counter():
+    """
+    Test that counting only keys of subtrees gives the same results as counting representation trees.
+    :return:
+    """
+    config_file = os.path.join(CONFIGS_DIR, 'config_greedy_complete.ini')
+    for args in [['--complete', 'no', '--fixed', 'no', '--size', '1-3', '--processing_size', '1-3'],
+                 ['--complete', 'no', '--fixed', 'yes', '--labeled', 'no', '--size', '2-3', '--processing_size', '2-3',
+                  '--head', 'upos=VERB'],
+                 ['--complete', 'no', '--fixed', 'yes', '--size', '2-4', '--processing_size', '2-4',
+                  '--node_type', 'upos+form', '--allowed_labels', 'nsubj|obj|amod|case|det|punct'],
+                 ['--complete', 'yes', '--fixed', 'yes', '--size', '1-4', '--processing_size', '1-4',
+                  '--cpu_cores', '2']]:
+        settings = read_settings(config_file, parse_args(args))
+        results = []
+        for counter_class in [GreedyCounter, GreedyKeyCounter]:
+            filters = read_filters(settings)
+            summary = Summary()
+            document = DocumentProcessor(settings['input_path'], Processor(settings, filters)).form_trees(summary,
+                                                                                                      settings)
+            counter_class([document], summary, filters, settings).run()
+            writer = TSVWriter(summary, None, filters, settings)
+            results.append(([(writer.render_key(k), v) for k, v in summary.representation_trees.items()],
+                            summary.unigrams, summary.max_tree_size))
+        assert results[0] == results[1]